@@ -0,0 +1,72 @@
+"""
+Сравнение профилей кодирования карточек: время кодирования против размера файла.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_encoding [--repeat 20] [--json results.json]
+"""
+from benchmarks.common import fake_avatar  # Первым: выставляет BOT_TOKEN для settings.py
+
+import argparse
+import json
+import statistics
+import time
+
+from settings import LEVELS
+from utils.assets import assets
+from utils.generator import Generator, ENCODING_PROFILES
+
+
+def draw_cards():
+    return {
+        "roadmap": Generator.draw_roadmap(
+            "benchmark_user", fake_avatar(Generator.ROADMAP_AVATAR_SIZE),
+            12345, 17700, 12, 2, LEVELS
+        ),
+        "bp_card": Generator.draw_bp_card(
+            "benchmark_user", 12, 12345, 17700, fake_avatar(Generator.BP_AVATAR_SIZE)
+        ),
+    }
+
+
+def bench(img, encoding, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        buffer = Generator.encode(img, encoding)
+        timings.append(time.perf_counter() - started)
+        size = len(buffer.getvalue())
+    return {
+        "encode_ms_median": round(statistics.median(timings) * 1000, 2),
+        "encode_ms_min": round(min(timings) * 1000, 2),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Куда сохранить результаты")
+    args = parser.parse_args()
+
+    assets.preload()
+    cards = draw_cards()
+
+    results = {}
+    for card, img in cards.items():
+        results[card] = {}
+        print(f"\n{card} ({img.width}x{img.height})")
+        print(f"{'профиль':<16}{'мс (медиана)':>14}{'мс (мин)':>10}{'КБ':>10}")
+        for encoding in ENCODING_PROFILES:
+            r = bench(img, encoding, args.repeat)
+            results[card][encoding] = r
+            print(f"{encoding:<16}{r['encode_ms_median']:>14}{r['encode_ms_min']:>10}{r['bytes'] / 1024:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты сохранены в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
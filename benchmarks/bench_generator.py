@@ -0,0 +1,195 @@
+"""
+Офлайн-бенчмарк генератора карточек (utils/generator.py).
+
+Гоняет Generator.create_roadmap, Generator.create_bp_card, get_progressbar и make_circle
+на синтетических пользователях с локальными аватарками (без сети и без Дискорда).
+Считает p50/p95/p99, пропускную способность на 1..N воркерах, пиковый RSS и аллокации.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_generator [--iterations 200] [--workers 4] [--mode thread|process]
+                                         [--json out.json] [--compare base.json]
+"""
+from benchmarks.common import FakeAvatarSource, synthetic_users, git_commit  # Первым: BOT_TOKEN для settings.py
+
+import argparse
+import datetime
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+
+import PIL
+from settings import LEVELS
+from utils.assets import assets
+from utils.avatars import AvatarService
+from utils.generator import Generator
+
+SCENARIOS = ("make_circle", "get_progressbar", "create_bp_card", "create_roadmap")
+
+_source = None
+_decoded = {}  # {(url, size): Image} — аватарки декодируются один раз на процесс, как в AvatarService
+
+
+def _init_worker():
+    global _source
+    _source = FakeAvatarSource()
+    assets.preload()
+
+
+def _avatar(url, size):
+    key = (url, size)
+    if key not in _decoded:
+        _decoded[key] = AvatarService._decode(_source.fetch(url), size)
+    return _decoded[key]
+
+
+def run_job(scenario, user):
+    """Одна операция сценария. Возвращает время выполнения в секундах."""
+    started = time.perf_counter()
+    if scenario == "make_circle":
+        AvatarService._decode(_source.fetch(user["avatar_url"]), Generator.ROADMAP_AVATAR_SIZE)
+    elif scenario == "get_progressbar":
+        Generator.get_progressbar(user["xp"], user["need_xp"], 'bar_empty.png', 'bar_full.png')
+    elif scenario == "create_bp_card":
+        Generator.create_bp_card(user["username"], user["level"], user["xp"], user["need_xp"],
+                                 _avatar(user["avatar_url"], Generator.BP_AVATAR_SIZE))
+    elif scenario == "create_roadmap":
+        Generator.create_roadmap(user["username"], _avatar(user["avatar_url"], Generator.ROADMAP_AVATAR_SIZE),
+                                 user["xp"], user["need_xp"], user["level"], user["page"], LEVELS)
+    return time.perf_counter() - started
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def peak_rss_kb():
+    """Пиковый RSS процесса и дочерних процессов (ru_maxrss на Linux в КБ, на macOS в байтах)"""
+    scale = 1024 if sys.platform == "darwin" else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return own, children
+
+
+def bench_latency(scenario, users):
+    """Последовательные вызовы в одном потоке — чистая задержка одной операции"""
+    run_job(scenario, users[0])  # Прогрев (кэши слоев, шрифты)
+    timings = sorted(run_job(scenario, u) for u in users)
+    ms = [t * 1000 for t in timings]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+    }
+
+
+def bench_allocations(scenario, users):
+    """Аллокации Python-объектов (tracemalloc). Пиксели Pillow живут в C-памяти — их видно по RSS."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for u in users:
+        run_job(scenario, u)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    return {
+        "alloc_blocks_new": sum(max(0, s.count_diff) for s in stats),
+        "alloc_peak_kb": round(peak / 1024, 1),
+    }
+
+
+def bench_throughput(scenario, users, workers, mode):
+    """Операций в секунду при workers параллельных воркерах"""
+    if mode == "process":
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    with executor:
+        # Прогрев воркеров, чтобы не мерить старт процессов
+        list(executor.map(run_job, [scenario] * workers, users[:workers]))
+        started = time.perf_counter()
+        list(executor.map(run_job, [scenario] * len(users), users))
+        elapsed = time.perf_counter() - started
+    return round(len(users) / elapsed, 2)
+
+
+def compare(results, base_path):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nСравнение с {base_path} (коммит {base.get('meta', {}).get('commit')}):")
+    for scenario, cur in results.items():
+        old = base.get("results", {}).get(scenario)
+        if not old:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if old.get(key):
+                parts.append(f"{key} {(cur[key] - old[key]) / old[key] * 100:+.1f}%")
+        for w, ops in cur["throughput_ops"].items():
+            old_ops = old.get("throughput_ops", {}).get(w)
+            if old_ops:
+                parts.append(f"x{w} {(ops - old_ops) / old_ops * 100:+.1f}% ops/s")
+        print(f"  {scenario:<16} " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="Операций на сценарий")
+    parser.add_argument("--workers", type=int, default=4, help="Максимум параллельных воркеров (1..N)")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--json", help="Куда сохранить результаты")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    _init_worker()
+    users = synthetic_users(args.iterations, _source.urls(), LEVELS)
+
+    results = {}
+    for scenario in args.scenarios:
+        r = bench_latency(scenario, users)
+        r.update(bench_allocations(scenario, users[:min(50, len(users))]))
+        r["throughput_ops"] = {
+            str(w): bench_throughput(scenario, users, w, args.mode) for w in range(1, args.workers + 1)
+        }
+        r["peak_rss_kb"], r["peak_rss_children_kb"] = peak_rss_kb()
+        results[scenario] = r
+
+        thr = " ".join(f"x{w}={ops}" for w, ops in r["throughput_ops"].items())
+        print(f"{scenario:<16} p50={r['p50_ms']}мс p95={r['p95_ms']}мс p99={r['p99_ms']}мс | "
+              f"ops/s: {thr} | RSS={r['peak_rss_kb'] // 1024}МБ | "
+              f"аллокаций: {r['alloc_blocks_new']} (пик {r['alloc_peak_kb']}КБ)")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "cpu_count": multiprocessing.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты сохранены в {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
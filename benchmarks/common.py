@@ -0,0 +1,66 @@
+"""Общие помощники для бенчмарков: синтетические пользователи и локальный источник аватарок."""
+import os
+os.environ.setdefault("BOT_TOKEN", "benchmark")  # settings.py без токена не импортируется
+
+import io
+import random
+import subprocess
+
+from PIL import Image
+from utils.generator import Generator
+
+
+def fake_avatar_bytes(seed):
+    """PNG 256x256 с градиентом — похоже на настоящую аватарку по сжатию и декодированию"""
+    rnd = random.Random(seed)
+    img = Image.radial_gradient("L").resize((256, 256))
+    channels = [img.rotate(rnd.choice((0, 90, 180, 270))) for _ in range(3)]
+    img = Image.merge("RGBA", (*channels, Image.new("L", img.size, 255)))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def fake_avatar(size, seed=0):
+    """Готовая круглая аватарка, как ее отдает utils/avatars.py"""
+    img = Image.open(io.BytesIO(fake_avatar_bytes(seed))).convert("RGBA").resize((size, size))
+    return Generator.make_circle(img)
+
+
+class FakeAvatarSource:
+    """Локальная "CDN": url -> bytes, без сети"""
+
+    def __init__(self, count=16):
+        self.files = {f"local://avatar/{i}.png": fake_avatar_bytes(i) for i in range(count)}
+
+    def urls(self):
+        return list(self.files)
+
+    def fetch(self, url):
+        return self.files[url]
+
+
+def synthetic_users(count, avatar_urls, levels, seed=42):
+    """Список случайных пользователей с уровнем, XP и страницей roadmap"""
+    rnd = random.Random(seed)
+    max_lvl = max(levels) if levels else 30
+    users = []
+    for i in range(count):
+        level = rnd.randint(0, max_lvl)
+        need_xp = levels.get(level + 1, {}).get("exp_need", 99999)
+        users.append({
+            "username": f"user_{i}_{rnd.randint(1000, 9999)}",
+            "avatar_url": rnd.choice(avatar_urls),
+            "level": level,
+            "xp": rnd.randint(0, need_xp),
+            "need_xp": need_xp,
+            "page": rnd.randint(1, 3),
+        })
+    return users
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -1,11 +1,12 @@
 import discord
 import traceback
 from discord import app_commands, ui
-import asyncio
+import time
 from discord.ext import commands
 from database import db
-from settings import ITEMS_DB, LEVELS
+from settings import ITEMS_DB, LEVELS, MONGO_MIN_POOL, MONGO_MAX_POOL
 from utils.logger import log
+from utils.xp_rates import xp_rates
 
 # --- 1. ВЫПАДАЮЩИЙ СПИСОК УРОВНЕЙ ---
 class LevelSelect(ui.Select):
@@ -84,28 +85,22 @@ class ManualXPModal(ui.Modal, title="Изменить XP"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             amount = int(self.xp_amount.value)
-            user_data = await db.find_user(self.target_user.id)
-            
-            if not user_data: # Если юзера нет, создаем
-                await db.create_user(self.target_user.id, self.target_user.name)
-                user_data = {"xp": 0}
-
-            current_xp = user_data.get('xp', 0)
-            new_xp = max(0, current_xp + amount)
-            exp_need = LEVELS[user_data['level']]['exp_need'] if (user_data['level'] + 1) in LEVELS else None
-            if new_xp >= exp_need and exp_need is not None:
-                for lvl in range(user_data['level'], len(LEVELS)):
-                    lvl_data = LEVELS[lvl]
-                    if lvl_data['exp_need'] <= new_xp and lvl != 30:
-                        continue
-                    else:
-                        await db.update_user(self.target_user.id, {"level": lvl})
-                        break
-         
-            # exp_need = LEVELS[next_lvl]['exp_need'] if (next_lvl) in LEVELS else None
-            await db.update_user(self.target_user.id, {"xp": new_xp})
-            # if new_xp >= exp_need and exp_need is not None:
-            #     await db.update_user(self.target_user.id, {"level": next_lvl})
+
+            # Атомарное изменение: не перетирает параллельные начисления, уровень считается сразу
+            if amount >= 0:
+                user_data, crossed = await db.add_xp(self.target_user.id, amount, self.target_user.name)
+                new_xp = user_data.get('xp', 0)
+                current_xp = new_xp - amount
+            else:
+                taken = await db.take_xp(self.target_user.id, -amount)
+                user_data = await db.find_user(self.target_user.id) or {}
+                new_xp = user_data.get('xp', 0)
+                current_xp = new_xp + taken
+                crossed = []
+
+            leveling_cog = interaction.client.get_cog('Leveling')
+            if crossed and leveling_cog:
+                await leveling_cog.notify_level_up(self.target_user.id, crossed)
             
             log(f"Админ {interaction.user} изменил XP {self.target_user}: {current_xp} -> {new_xp}", level="DEBUG")
             await interaction.response.send_message(f"✅ XP изменен: **{current_xp}** ➡️ **{new_xp}**", ephemeral=True)
@@ -192,6 +187,11 @@ class AdminPanelView(ui.View):
             # Обновляем Предметы
             settings.ITEMS_DB.clear()
             settings.ITEMS_DB.update(new_items)
+
+            # Сбрасываем закэшированные слои roadmap со старыми описаниями наград
+            settings.bump_config_version()
+            from utils.generator import Generator
+            Generator.clear_static_layers()
             
             from utils.logger import log
             log(f"Конфиги обновлены (Hot Reload). Levels: {len(settings.LEVELS)}, Items: {len(settings.ITEMS_DB)}", level="SUCCESS")
@@ -219,7 +219,7 @@ class Admin(commands.Cog):
         if not interaction.user.guild_permissions.administrator:
              return await interaction.response.send_message("⛔ Только для админов!", ephemeral=True)
 
-        db_user = await db.find_user(user.id)
+        db_user = await db.find_user(user.id, "profile")
         embed = discord.Embed(title="🛠️ Админ Панель", color=discord.Color.dark_red())
         embed.set_thumbnail(url=user.display_avatar.url)
         embed.add_field(name="User", value=user.mention, inline=False)
@@ -259,11 +259,97 @@ class Admin(commands.Cog):
 
     @commands.command(name="sync_db")
     @commands.has_permissions(administrator=True)
-    async def sync_db(self, ctx):
-        """Синхронизация базы данных, добавляет всех пользователей на сервере в бд"""
-        members = ctx.guild.members
-        await asyncio.gather(*[db.create_user(user_id=member.id, username=member.name) for member in members])
-        await ctx.send(f"✅ База данных успешно синхронизирована")
+    async def sync_db(self, ctx, refresh_names: bool = False):
+        """Синхронизация базы данных, добавляет всех пользователей на сервере в бд (!sync_db yes — еще и обновить ники)"""
+        members = {member.id: member.name for member in ctx.guild.members}
+        status = await ctx.send(f"⏳ Синхронизация: 0 / {len(members)}")
+        last_edit = time.monotonic()
+
+        async def progress(done, total):
+            nonlocal last_edit
+            # Не чаще раза в 2 секунды — иначе упремся в лимиты на редактирование
+            if done < total and time.monotonic() - last_edit < 2:
+                return
+            last_edit = time.monotonic()
+            await status.edit(content=f"⏳ Синхронизация: {done} / {total}")
+
+        result = await db.sync_members(members, refresh_names=refresh_names, progress=progress)
+        text = (f"✅ База данных успешно синхронизирована за {result['elapsed']:.1f} с\n"
+                f"Участников: {result['total']} | Добавлено: {result['inserted']}")
+        if refresh_names:
+            text += f" | Обновлено ников: {result['renamed']}"
+        await status.edit(content=text)
+
+
+    @commands.command(name="stats")
+    @commands.has_permissions(administrator=True)
+    async def perf_stats(self, ctx):
+        """Счетчики производительности бота"""
+        from utils.render_pool import renderer
+        from utils.render_cache import render_cache
+        r = renderer.stats()
+        embed = discord.Embed(title="📈 Статистика", color=discord.Color.blurple())
+        embed.add_field(
+            name="Рендер",
+            value=(f"Режим: `{r['mode']}` x{r['workers']}\n"
+                   f"В работе: {r['in_flight']} (в очереди {r['queue_depth']})\n"
+                   f"Готово: {r['completed']} | Ошибок: {r['failed']} | Отказов: {r['rejected']}\n"
+                   f"p50: {r['p50_ms']} мс | p95: {r['p95_ms']} мс"),
+            inline=False
+        )
+        c = render_cache.stats()
+        embed.add_field(
+            name="Кэш карточек",
+            value=(f"В памяти: {c['items']} ({c['memory_mb']} МБ) | На диске: {c['disk_items']}\n"
+                   f"Попаданий: {c['hits']} (+{c['disk_hits']} с диска) | Общих рендеров: {c['shared']} | Промахов: {c['misses']}"),
+            inline=False
+        )
+        from utils.masks import circle_cache
+        a = circle_cache.stats()
+        embed.add_field(
+            name="Аватарки",
+            value=f"В кэше: {a['items']} ({a['memory_mb']} МБ) | Попаданий: {a['hits']} ({a['hit_rate']}%) | Промахов: {a['misses']}",
+            inline=False
+        )
+        leveling_cog = self.bot.get_cog('Leveling')
+        if leveling_cog:
+            v = leveling_cog.voice_sessions.stats()
+            boosts = xp_rates.stats()['boosts']
+            embed.add_field(
+                name="Войс",
+                value=f"В войсе: {v['members']} (копят XP: {v['farming']}) | Каналов: {v['channels']} | Бустов: {boosts}",
+                inline=False
+            )
+            a = leveling_cog.announcer.stats()
+            embed.add_field(
+                name="Уведомления о повышении",
+                value=f"В очереди: {a['pending']} | Объявлено: {a['announced']} в {a['sent']} сообщ. | Выключены: {a['muted']}",
+                inline=False
+            )
+        tick = leveling_cog.last_tick if leveling_cog else None
+        if tick:
+            embed.add_field(
+                name="Тик войса",
+                value=f"<t:{int(tick['at'])}:R>: {tick['members']} польз., +{tick['xp']} XP за {tick['duration_ms']} мс",
+                inline=False
+            )
+        try:
+            ping = f"{await db.ping():.1f} мс"
+        except Exception as e:
+            ping = f"ошибка ({e})"
+        embed.add_field(
+            name="База данных",
+            value=f"Пинг: {ping} | Пул: {MONGO_MIN_POOL}–{MONGO_MAX_POOL}",
+            inline=False
+        )
+        u = db.cache.stats()
+        embed.add_field(
+            name="Кэш пользователей",
+            value=(f"В кэше: {u['items']} | Попаданий: {u['hits']} ({u['hit_rate']}%) | Промахов: {u['misses']}"
+                   if u['enabled'] else "Выключен"),
+            inline=False
+        )
+        await ctx.send(embed=embed)
 
 
     @commands.command(name="global_sync")
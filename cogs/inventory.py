@@ -11,9 +11,8 @@ class Inventory(commands.Cog):
         self.bot = bot
 
     async def item_autocomplete(self, interaction: discord.Interaction, current: str):
-        user = await db.find_user(interaction.user.id)
-        if not user: return []
-        inv = user.get("inventory", {})
+        inv = await db.get_inventory(interaction.user.id)
+        if not inv: return []
         choices = []
         for i_id, amt in inv.items():
             if amt > 0:
@@ -26,11 +25,10 @@ class Inventory(commands.Cog):
 
     @app_commands.command(name="inventory", description="Открыть инвентарь")
     async def inventory_cmd(self, interaction: discord.Interaction):
-        user = await db.find_user(interaction.user.id)
-        if not user:
+        inventory = await db.get_inventory(interaction.user.id)
+        if inventory is None:
             return await interaction.response.send_message("❌ Профиль не найден.", ephemeral=True)
 
-        inventory = user.get("inventory", {})
         actual_items = {k: v for k, v in inventory.items() if v > 0}
 
         if not actual_items:
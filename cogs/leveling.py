@@ -5,48 +5,91 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from database import db
 import asyncio
-from settings import LEVELS, CHANNEL_ID, ITEMS_DB
-from utils.generator import Generator, generate_image_in_thread
+from settings import LEVELS, ITEMS_DB, XP_FLUSH_INTERVAL, VOICE_JOURNAL_FSYNC
+from utils.cards import render_roadmap, render_bp_card, next_level_xp, ROADMAP_FILENAME, BP_CARD_FILENAME
+from utils.render_pool import RenderBusy
 from utils.ui import RoadmapPagination, BattlepassView
 from utils.logger import log
+from utils.xp_buffer import XPAccumulator
+from utils.voice_journal import VoiceJournal
+from utils.voice_sessions import VoiceSessionStore
+from utils.leaderboard import leaderboard
+from utils.xp_rates import xp_rates
+from utils.announcer import LevelUpAnnouncer
 
 class Leveling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.voice_sessions = {} # {user_id: start_time}
+        # Кто сидит в войсе (индексы по пользователю/серверу/каналу), копят XP — те, кто без мута
+        self.voice_sessions = VoiceSessionStore()
+        self.scanned_on_startup = False
+        # Входы/выходы/муты пишутся в журнал на диске — время в войсе не пропадет при падении
+        self.journal = VoiceJournal()
+        # XP копится в памяти и пишется в БД пачками (по таймеру или по размеру)
+        self.xp_buffer = XPAccumulator(on_flushed=self.handle_xp_flushed, journal=self.journal)
+        # Объявления о повышении уровня: очередь со сводками, не задерживает начисление XP
+        self.announcer = LevelUpAnnouncer(bot)
+        # Последний тик войса: {"members", "xp", "duration_ms", "at"} — для !stats
+        self.last_tick = None
         self.check_voice_xp.start()
+        self.flush_xp.start()
+        self.sync_journal.start()
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.check_voice_xp.cancel()
+        self.flush_xp.cancel()
+        self.sync_journal.cancel()
+        await self.xp_buffer.flush()
+        self.journal.close()
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL)
+    async def flush_xp(self):
+        await self.xp_buffer.flush()
+
+    @tasks.loop(seconds=VOICE_JOURNAL_FSYNC)
+    async def sync_journal(self):
+        await self.journal.sync()
 
     # --- НОВЫЙ МЕТОД: СОХРАНЕНИЕ ПЕРЕД ВЫКЛЮЧЕНИЕМ ---
     async def save_all_sessions(self):
         """Сохраняет прогресс всех, кто сейчас в войсе, и очищает сессии"""
-        if not self.voice_sessions:
+        sessions = self.voice_sessions.farming()
+        if not sessions:
             log("Нет активных голосовых сессий для сохранения.", level="INFO")
+            # Но накопленный XP все равно нужно записать
+            await self.xp_buffer.flush()
+            self.journal.clear()
+            self.journal.close()
+            await self.announcer.close()
             return
 
-        log(f"💾 Сохранение {len(self.voice_sessions)} активных сессий перед выключением...", level="WARN")
+        log(f"💾 Сохранение {len(sessions)} активных сессий перед выключением...", level="WARN")
         
         now = time.time()
         tasks = []
+        guild = self.bot.get_guild(self.bot.guild_id)
 
         # Пробегаем по всем активным сессиям
-        for user_id, start_time in list(self.voice_sessions.items()):
-            duration = now - start_time
-            xp_gained = int(duration / 60 * 10)
+        for user_id, channel_id, start_time in sessions:
+            xp_gained = xp_rates.xp(user_id, channel_id, start_time, now)
             if xp_gained > 0:
                 # Находим объект участника (чтобы знать имя)
-                guild = self.bot.get_guild(self.bot.guild_id) 
                 member = guild.get_member(user_id) if guild else None
                 
                 # Добавляем задачу сохранения в список
                 tasks.append(self.add_xp(member or user_id, xp_gained))
                 log(f"💾 Сохранен прогресс: ID {user_id} (+{xp_gained} XP)", level="DEBUG")
+            self.journal.leave(user_id, now)
 
         # Выполняем все сохранения параллельно
         if tasks:
             await asyncio.gather(*tasks)
+        # Сбрасываем весь накопленный XP одной пачкой
+        await self.xp_buffer.flush()
+        # Если запись в БД не удалась, журнал сохранит время до следующего запуска
+        self.journal.clear()
+        self.journal.close()
+        await self.announcer.close()
         
         self.voice_sessions.clear()
         log("✅ Все сессии успешно сохранены.", level="SUCCESS")
@@ -56,6 +99,29 @@ class Leveling(commands.Cog):
     async def on_ready(self):
         """Сканирует каналы при запуске и возобновляет сессии"""
         if self.scanned_on_startup: return
+        self.scanned_on_startup = True
+
+        # AFK-каналы серверов XP не дают
+        for guild in self.bot.guilds:
+            if guild.afk_channel:
+                xp_rates.set_channel(guild.afk_channel.id, 0)
+
+        # Сначала — время, которое не успели записать до падения/перезапуска
+        intervals, last_seen = self.journal.replay()
+        # Бусты из БД (включая закончившиеся во время несохраненных интервалов)
+        boosts_after = min((start for _, _, start, _ in intervals), default=time.time())
+        for doc in await db.active_boosts(boosts_after):
+            boost = doc["boost"]
+            xp_rates.restore_boost(doc["_id"], boost["since"], boost["until"], boost["multiplier"])
+        if intervals:
+            restored_xp = 0
+            for user_id, channel_id, start, end in intervals:
+                xp_gained = xp_rates.xp(user_id, channel_id, start, end)
+                self.xp_buffer.add(user_id, xp_gained)
+                restored_xp += xp_gained
+            await self.xp_buffer.flush()
+            log(f"♻️ Из журнала войса восстановлено {restored_xp} XP "
+                f"({len(intervals)} интервалов, последняя запись {time.strftime('%d.%m %H:%M:%S', time.localtime(last_seen))})", level="SUCCESS")
         
         log("🔄 Сканирование голосовых каналов...", level="INFO")
         count = 0
@@ -69,11 +135,13 @@ class Leveling(commands.Cog):
                     # Проверяем условия (мут/деф)
                     is_muted = member.self_mute or member.self_deaf or member.mute or member.deaf
                     
+                    self.voice_sessions.join(member.id, guild.id, channel.id, now, farming=not is_muted)
                     if not is_muted:
-                        self.voice_sessions[member.id] = now
+                        self.journal.join(member.id, channel.id, now)
                         count += 1
-        
-        self.scanned_on_startup = True
+
+        # Журнал сохранен в БД — оставляем в нем только текущие сессии
+        self.journal.compact_if_clean()
         if count > 0:
             log(f"✅ Восстановлено сессий: {count}", level="SUCCESS")
         else:
@@ -85,17 +153,35 @@ class Leveling(commands.Cog):
 
         is_muted = after.self_mute or after.self_deaf or after.mute or after.deaf
         
+        now = time.time()
+        
         # Вход в канал
         if before.channel is None and after.channel is not None:
+            self.voice_sessions.join(member.id, member.guild.id, after.channel.id, now, farming=not is_muted)
             if not is_muted:
-                self.voice_sessions[member.id] = time.time()
+                self.journal.join(member.id, after.channel.id, now)
         
         # Выход из канала
         elif before.channel is not None and after.channel is None:
             await self.process_voice_session(member)
+            self.voice_sessions.leave(member.id)
         
-        # Переключение мута внутри канала
+        # Переход между каналами и переключение мута
         elif before.channel is not None and after.channel is not None:
+            if before.channel.id != after.channel.id:
+                # У каналов разная скорость XP — закрываем отрезок в старом канале
+                session = self.voice_sessions.get(member.id)
+                if session and session.start is not None and xp_rates.rate(session.channel_id) != xp_rates.rate(after.channel.id):
+                    await self.process_voice_session(member)
+                    self.voice_sessions.start_farming(member.id, now)
+                    self.journal.join(member.id, after.channel.id, now)
+                self.voice_sessions.move(member.id, after.channel.id, now)
+            if member.id not in self.voice_sessions:
+                # Зашел, пока бот не видел (например, до сканирования)
+                self.voice_sessions.join(member.id, member.guild.id, after.channel.id, now, farming=not is_muted)
+                if not is_muted:
+                    self.journal.join(member.id, after.channel.id, now)
+
             was_muted = before.self_mute or before.self_deaf or before.mute or before.deaf
             
             # Включил мут (перестал фармить)
@@ -103,14 +189,18 @@ class Leveling(commands.Cog):
                 await self.process_voice_session(member)
             # Выключил мут (начал фармить)
             elif was_muted and not is_muted:
-                self.voice_sessions[member.id] = time.time()
+                self.voice_sessions.start_farming(member.id, now)
+                self.journal.join(member.id, after.channel.id, now)
 
     async def process_voice_session(self, member):
-        if member.id in self.voice_sessions:
-            start_time = self.voice_sessions.pop(member.id)
-            duration = time.time() - start_time
+        session = self.voice_sessions.get(member.id)
+        start_time = self.voice_sessions.stop_farming(member.id)
+        if start_time is not None:
+            now = time.time()
+            self.journal.leave(member.id, now)
+            duration = now - start_time
             
-            xp_gained = int(duration / 60 * 10)
+            xp_gained = xp_rates.xp(member.id, session.channel_id, start_time, now)
 
             if xp_gained > 0:
                 await self.add_xp(member, xp_gained)
@@ -118,37 +208,56 @@ class Leveling(commands.Cog):
 
     @tasks.loop(minutes=5)
     async def check_voice_xp(self):
-        # Начисляем опыт тем, кто сидит прямо сейчас, не дожидаясь выхода
+        # Начисляем опыт тем, кто сидит прямо сейчас, не дожидаясь выхода.
+        # Один проход по сессиям -> дельты в буфер -> один bulk_write и проверка уровней во flush
+        started = time.perf_counter()
         now = time.time()
-        for user_id, start_time in list(self.voice_sessions.items()):
-            duration = now - start_time
-            xp_gained = int(duration / 60 * 10)
+        guild = self.bot.get_guild(self.bot.guild_id)
+        members = total_xp = 0
+        for user_id, channel_id, start_time in self.voice_sessions.farming():
+            xp_gained = xp_rates.xp(user_id, channel_id, start_time, now)
             if xp_gained > 0:
-                member = self.bot.get_guild(self.bot.guild_id).get_member(user_id)
-                if member:
-                    await self.add_xp(member, xp_gained)
-                    self.voice_sessions[user_id] = now # Сбрасываем таймер на "сейчас"
+                member = guild.get_member(user_id) if guild else None
+                self.xp_buffer.add(user_id, xp_gained, member.name if member else None)
+                self.voice_sessions.restart(user_id, now) # Сбрасываем таймер на "сейчас"
+                members += 1
+                total_xp += xp_gained
+        self.journal.tick(now)
+        # Закончившиеся бусты учтены в этом тике — убираем
+        xp_rates.expire(now)
+        await self.xp_buffer.flush()
+
+        self.last_tick = {
+            "members": members,
+            "xp": total_xp,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "at": now,
+        }
+        log(f"⏱️ Тик войса: {members} польз., +{total_xp} XP за {self.last_tick['duration_ms']} мс", level="DEBUG")
+
+    async def start_boost(self, user_id):
+        """Включает (или продлевает) буст XP в войсе. Возвращает время окончания."""
+        since, until, multiplier = xp_rates.add_boost(user_id, time.time())
+        await db.save_boost(user_id, since, until, multiplier)
+        return until
 
     async def add_xp(self, member, amount):
-        user = await db.find_user(member.id)
-        if not user:
-            user = await db.create_user(member.id, member.name)
-        
-        current_xp = user['xp'] + amount
-        current_lvl = user['level']
-        
-        # Проверка повышения уровня
-        next_lvl_data = LEVELS.get(current_lvl + 1)
-        if next_lvl_data and current_xp >= next_lvl_data['exp_need']:
-            new_lvl = current_lvl + 1
-            await db.update_user(member.id, {"xp": current_xp, "level": new_lvl})
-            
-            # Уведомление
-            channel = self.bot.get_channel(CHANNEL_ID)
-            if channel:
-                await channel.send(f"🎉 {member.mention} достиг уровня {new_lvl}!")
-        else:
-            await db.update_user(member.id, {"xp": current_xp})
+        """Кладет XP в буфер. В БД он попадет при следующем flush (уровни проверяются там же)."""
+        user_id = getattr(member, 'id', member)
+        self.xp_buffer.add(user_id, amount, getattr(member, 'name', None))
+
+    async def handle_xp_flushed(self, docs, deltas):
+        """Проверка повышения уровня по итоговым значениям после записи пачки"""
+        level_ups = await db.apply_level_ups(docs)
+        for user_id, crossed in level_ups.items():
+            await self.notify_level_up(user_id, crossed)
+
+    async def notify_level_up(self, user_id, crossed):
+        """
+        Уведомление о повышении. crossed — все пройденные уровни (за раз можно пройти несколько).
+        Только ставит в очередь: отправка — сводками в фоне (LevelUpAnnouncer).
+        """
+        self.announcer.push(user_id, crossed)
 
     @app_commands.command(name="roadmap", description="Карта наград и уровней")
     async def roadmap(self, interaction: discord.Interaction):
@@ -158,13 +267,13 @@ class Leveling(commands.Cog):
         try:
             # --- ОТЛАДКА 1: Проверка базы данных ---
             log("Ищу пользователя в БД...", level="DEBUG")
-            user = await db.find_user(interaction.user.id)
+            user = await db.get_progress(interaction.user.id)
             
             if not user:
                 log("Пользователь не найден в БД", level="WARN")
                 return await interaction.followup.send("Ваш профиль не найден в базе. Обратитесь к <@namequalsmain>")
             
-            log(f"Пользователь найден: {user.get('username')}", level="SUCCESS")
+            log(f"Пользователь найден: {interaction.user.name}", level="SUCCESS")
 
             # --- ОТЛАДКА 2: Проверка переменных ---
             raw_level = user.get('level')
@@ -196,40 +305,26 @@ class Leveling(commands.Cog):
             # --- ВОТ ТА САМАЯ "ПРОБЛЕМНАЯ" СТРОКА ---
             log(f"Calculated LVL: {lvl}. Trying to get next level info...", level='DEBUG')
             
-            # Безопасное получение следующего уровня
-            next_lvl_key = lvl + 1
-            
-            # Проверяем, существует ли ключ в словаре
-            if next_lvl_key in LEVELS:
-                need_xp = LEVELS[next_lvl_key]['exp_need']
-            else:
-                log(f"Уровня {next_lvl_key} нет в конфиге. Ставлю заглушку.", level="WARN")
-                need_xp = current_xp # Или любое число
+            # Безопасное получение следующего уровня (на последнем — заполненная полоса)
+            need_xp = next_level_xp(lvl, current_xp)
 
             log(f"Цель XP: {need_xp}", level='DEBUG')
 
             # --- ГЕНЕРАЦИЯ ---
             log("Запускаю генератор...", level="DEBUG")
-            buffer = await generate_image_in_thread(
-                Generator.create_roadmap,
-                interaction.user.name,
-                interaction.user.display_avatar.url,
-                current_xp,
-                need_xp,
-                lvl,
-                page,
-                LEVELS
-            )
+            buffer = await render_roadmap(interaction.user, current_xp, need_xp, lvl, page, prerender=True)
             
             if buffer is None:
                 await interaction.followup.send("Ошибка генерации (см. консоль)")
                 return
 
-            file = discord.File(fp=buffer, filename="roadmap.png")
+            file = discord.File(fp=buffer, filename=ROADMAP_FILENAME)
             view = RoadmapPagination(interaction.user, page, user)
             await interaction.followup.send(file=file, view=view, ephemeral=True)
             log("Сообщение отправлено!", level="SUCCESS")
 
+        except RenderBusy as e:
+            await interaction.followup.send(str(e), ephemeral=True)
         except Exception as e:
             # ЭТО ПОКАЖЕТ ТЕБЕ ОШИБКУ В ТЕРМИНАЛЕ
             log(f"КРИТИЧЕСКАЯ ОШИБКА В КОМАНДЕ ROADMAP:\n{e}", level='ERROR')
@@ -242,38 +337,48 @@ class Leveling(commands.Cog):
             await interaction.response.defer(thinking=True, ephemeral=True) 
 
             log("Ищу пользователя в БД...", level="DEBUG")
-            user = await db.find_user(interaction.user.id)
+            user = await db.get_progress(interaction.user.id)
             
             if not user:
                 log("Пользователь не найден в БД, добавляю", level="WARN")
                 await db.create_user(interaction.user.id, interaction.user.display_name)
             
-            log(f"Пользователь найден: {user.get('username')}", level="SUCCESS")
+            log(f"Пользователь найден: {interaction.user.name}", level="SUCCESS")
             lvl = user['level']
             xp = user['xp']
-            next_lvl_key = lvl + 1
-            if next_lvl_key in LEVELS:
-                need_xp = LEVELS[next_lvl_key]['exp_need']
-            else:
-                log(f"Уровня {next_lvl_key} нет в конфиге. Ставлю заглушку.", level="WARN")
-                need_xp = user['xp'] # Или любое число
-            buffer = await generate_image_in_thread(
-                Generator.create_bp_card,
-                interaction.user.name,
-                lvl,
-                xp,
-                need_xp,
-                interaction.user.display_avatar.url,
-            )
+            need_xp = next_level_xp(lvl, xp)
+            buffer = await render_bp_card(interaction.user, lvl, xp, need_xp)
             view = BattlepassView(interaction.user.id)
 
-            file = discord.File(fp=buffer, filename="roadmap.png")
+            file = discord.File(fp=buffer, filename=BP_CARD_FILENAME)
             await interaction.followup.send(file=file, view=view)
+        except RenderBusy as e:
+            await interaction.followup.send(str(e), ephemeral=True)
         except Exception as e:
             # ЭТО ПОКАЖЕТ ТЕБЕ ОШИБКУ В ТЕРМИНАЛЕ
             log(f"КРИТИЧЕСКАЯ ОШИБКА В КОМАНДЕ BATTLEPASS:\n{e}", level='ERROR')
             print(traceback.format_exc())
             await interaction.followup.send(f"Произошла ошибка: {e}")
+    @app_commands.command(name="top", description="Таблица лидеров по опыту")
+    async def top(self, interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        try:
+            top_users = await leaderboard.top()
+            medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+            lines = []
+            for place, doc in enumerate(top_users, start=1):
+                lines.append(f"{medals.get(place, f'`#{place}`')} <@{doc['_id']}> — ⭐ {doc.get('level', 0)} | {doc.get('xp', 0)} XP")
+
+            embed = discord.Embed(title="🏆 Таблица лидеров", description="\n".join(lines) or "Пока пусто", color=discord.Color.gold())
+            me = await db.get_progress(interaction.user.id)
+            if me:
+                rank = await leaderboard.rank(interaction.user.id, me.get('xp', 0))
+                embed.set_footer(text=f"Ваше место: #{rank} ({me.get('xp', 0)} XP)")
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            log(f"Ошибка в команде TOP: {e}", level='ERROR')
+            await interaction.followup.send(f"Произошла ошибка: {e}")
+
     @app_commands.command(name="profile", description="Посмотреть профиль")
     async def profile_slash(self, interaction: discord.Interaction):
         try:
@@ -287,7 +392,7 @@ class Leveling(commands.Cog):
         user = interaction.user
         try:
             log("[Profile] Defer отправлен.", level="DEBUG")
-            db_user = await db.find_user(user.id)
+            db_user = await db.find_user(user.id, "profile")
             if not db_user:
                 log(f"[Profile] Пользователь {user.name} не найден в БД.", level="WARN")
                 # Создаем временную структуру, чтобы команда не упала
@@ -327,6 +432,8 @@ class Leveling(commands.Cog):
             embed.add_field(name="⭐ Уровень", value=f"**{lvl}**", inline=True)
             embed.add_field(name="📊 Опыт", value=f"`{xp} / {next_lvl_xp}` ({progress_percent}%)", inline=True)
             embed.add_field(name="📅 Участник сервера с", value=reg_date_str, inline=True)
+            if db_user:
+                embed.add_field(name="🏆 Место", value=f"**#{await leaderboard.rank(user.id, xp)}**", inline=True)
             
             embed.add_field(name="🎒 Инвентарь (Топ)", value=inv_str, inline=False)
             
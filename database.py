@@ -1,18 +1,146 @@
-import motor.motor_asyncio
+import asyncio
 import time
-from settings import MONGO_URL
+from bson.int64 import Int64
+from settings import MONGO_URL, SYNC_CHUNK_SIZE, MONGO_MAX_POOL, MONGO_MIN_POOL, MONGO_TIMEOUT_MS, MONGO_WARM_CONNECTIONS, STORAGE_BACKEND
+from storage.base import DuplicateKey
+from utils.logger import log
+from utils.levels import level_for_xp, levels_crossed, rewards_mask
+from utils.user_cache import UserCache
 
-class DatabaseManager:
-    def __init__(self):
-        self.client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+# Наборы полей для частичного чтения (find_user(..., projection=...))
+PROJECTIONS = {
+    "inventory": {"inventory": 1},
+    "progress": {"xp": 1, "level": 1},
+    "settings": {"settings": 1},
+    "claim": {"level": 1, "rewards_mask": 1},
+    "profile": {"xp": 1, "level": 1, "reg_date": 1, "inventory": 1},
+    "boost": {"boost": 1},
+}
+
+# Индексы коллекции users: [(ключи, опции create_index)].
+# Все частичные чтения выше ищут по _id — их обслуживает встроенный индекс _id,
+# проекция лишь сокращает объем передаваемого документа. Сюда попадают только
+# индексы для запросов не по _id.
+USER_INDEXES = [
+    # Таблица лидеров: топ читается по индексу, место — count по диапазону xp
+    ([("xp", -1), ("_id", 1)], {"name": "xp_desc"}),
+]
+
+
+def make_backend(name=STORAGE_BACKEND):
+    """Хранилище пользователей по имени из настроек: mongo | memory"""
+    if name == "memory":
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    if name == "mongo":
+        from storage.mongo import MongoBackend
         # Используем одну базу данных, но разные коллекции
-        self.db = self.client['Main_Database'] 
-        self.users = self.db['users']
-    async def find_user(self, user_id):
-        return await self.users.find_one({"_id": user_id})
+        return MongoBackend(
+            MONGO_URL, 'Main_Database', 'users',
+            maxPoolSize=MONGO_MAX_POOL,
+            minPoolSize=MONGO_MIN_POOL,
+            connectTimeoutMS=MONGO_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        )
+    raise ValueError(f"Неизвестное хранилище: {name}")
 
-    async def create_user(self, user_id, username):
-        new_user = {
+
+class DatabaseManager:
+    def __init__(self, backend=None):
+        # Коллекция пользователей (storage/: MongoBackend или MemoryBackend)
+        self.users = backend or make_backend()
+        # Горячие документы пользователей в памяти (USER_CACHE_TTL = 0 — выключено)
+        self.cache = UserCache()
+        # Растет при каждой записи XP — по нему таблица лидеров понимает, что устарела
+        self.xp_writes = 0
+
+    async def find_user(self, user_id, projection=None):
+        """
+        Документ пользователя или None.
+        projection — имя из PROJECTIONS или словарь полей верхнего уровня.
+        При промахе документ читается целиком и кладется в кэш, проекция применяется в памяти:
+        следующие чтения с любой проекцией — попадания. Без кэша из БД читаются только нужные поля.
+        """
+        if isinstance(projection, str):
+            projection = PROJECTIONS[projection]
+        hit, user = self.cache.get(user_id)
+        if not hit:
+            if projection and not self.cache.enabled:
+                return await self.users.find_one({"_id": user_id}, projection)
+            epoch = self.cache.epoch
+            user = await self.users.find_one({"_id": user_id})
+            self.cache.put(user_id, user, epoch)
+        if user and projection:
+            return {k: v for k, v in user.items() if k == "_id" or k in projection}
+        return user
+
+    async def ping(self):
+        """Пинг сервера, возвращает задержку в мс"""
+        started = time.perf_counter()
+        await self.users.ping()
+        return (time.perf_counter() - started) * 1000
+
+    async def warm_up(self, connections=MONGO_WARM_CONNECTIONS):
+        """
+        Прогрев при старте бота: проверка связи, создание индексов и открытие connections
+        соединений пула параллельными пингами — первые команды не платят за подключение.
+        Ошибки только логируются: бот запускается, а Motor переподключится сам.
+        """
+        try:
+            first = await self.ping()
+            await self.ensure_indexes()
+            await self.migrate_rewards_mask()
+            # Одновременные пинги заставляют пул открыть столько же соединений
+            latencies = await asyncio.gather(*[self.ping() for _ in range(max(connections, 1))])
+        except Exception as e:
+            log(f"БД недоступна при старте: {e}", level="ERROR")
+            return None
+        latencies.sort()
+        log(f"🗄️ БД готова: первое подключение {first:.0f} мс, пинг {latencies[len(latencies) // 2]:.1f} мс "
+            f"(макс. {latencies[-1]:.1f}), соединений прогрето: {len(latencies)}", level="INFO")
+        return {"connect_ms": first, "ping_ms": latencies[len(latencies) // 2], "max_ms": latencies[-1]}
+
+    async def migrate_rewards_mask(self):
+        """
+        Переводит старые документы со списка rewards_claimed на маску rewards_mask.
+        Идемпотентна: трогает только документы без маски. Возвращает число обновленных.
+        """
+        migrated = 0
+        while True:
+            # Обновленные документы выпадают из выборки, поэтому просто берем следующую пачку
+            docs = await self.users.find({"rewards_mask": {"$exists": False}}, {"rewards_claimed": 1}, limit=SYNC_CHUNK_SIZE)
+            if not docs:
+                break
+            migrated += await self.users.bulk_update([
+                ({"_id": doc["_id"], "rewards_mask": {"$exists": False}},
+                 {"$set": {"rewards_mask": Int64(rewards_mask(doc.get("rewards_claimed") or [0]))},
+                  "$unset": {"rewards_claimed": ""}},
+                 False)
+                for doc in docs
+            ])
+        if migrated:
+            self.cache.invalidate()
+            log(f"🗄️ rewards_claimed -> rewards_mask: обновлено {migrated} документов", level="INFO")
+        return migrated
+
+    async def ensure_indexes(self):
+        """Создает индексы из USER_INDEXES (если уже есть — ничего не делает)"""
+        for keys, options in USER_INDEXES:
+            await self.users.create_index(keys, **options)
+
+    async def get_inventory(self, user_id):
+        """Инвентарь {item_id: count} или None, если пользователя нет"""
+        user = await self.find_user(user_id, "inventory")
+        return user.get("inventory", {}) if user else None
+
+    async def get_progress(self, user_id):
+        """{"_id", "xp", "level"} или None"""
+        return await self.find_user(user_id, "progress")
+
+    @staticmethod
+    def new_user_doc(user_id, username):
+        """Документ нового пользователя со значениями по умолчанию"""
+        return {
             "_id": user_id,
             "username": username,
             "reg_date": time.time(),
@@ -20,29 +148,219 @@ class DatabaseManager:
             "level": 0,
             "rank": "Новичок",
             "inventory": {},
-            "rewards_claimed": [0],
+            "rewards_mask": Int64(1),  # бит N — награда за уровень N получена (бит 0 — как старый [0])
             "settings": {"lang": "ru", "ephermal": True},
         }
+
+    async def create_user(self, user_id, username):
+        new_user = self.new_user_doc(user_id, username)
         try:
             await self.users.insert_one(new_user)
+            self.cache.invalidate(user_id)
             return new_user
-        except:
+        except DuplicateKey:
             return None # Пользователь уже существует
 
+    async def sync_members(self, members: dict, refresh_names=False, chunk_size=SYNC_CHUNK_SIZE, progress=None):
+        """
+        Добавляет в БД недостающих участников сервера. members: {user_id: username}.
+        Идет пачками по chunk_size: один find по $in (только _id/username), затем insert_many(ordered=False)
+        лишь для отсутствующих. refresh_names=True заодно обновляет изменившиеся имена.
+        progress(done, total) — необязательный async-колбэк после каждой пачки.
+        Возвращает {"total", "inserted", "renamed", "elapsed"}.
+        """
+        started = time.perf_counter()
+        ids = list(members)
+        inserted = renamed = 0
+
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            docs = await self.users.find({"_id": {"$in": chunk}}, {"username": 1})
+            existing = {doc["_id"]: doc.get("username") for doc in docs}
+
+            missing = [self.new_user_doc(uid, members[uid]) for uid in chunk if uid not in existing]
+            if missing:
+                # Кто-то мог успеть создать часть пользователей раньше — дубликаты пропускаются
+                inserted += await self.users.insert_many(missing)
+
+            if refresh_names:
+                changed = [uid for uid, name in existing.items() if name != members[uid]]
+                if changed:
+                    await self.users.bulk_update(
+                        [({"_id": uid}, {"$set": {"username": members[uid]}}, False) for uid in changed]
+                    )
+                    renamed += len(changed)
+                    for uid in changed:
+                        self.cache.patch(uid, set_fields={"username": members[uid]})
+
+            if progress:
+                await progress(min(start + chunk_size, len(ids)), len(ids))
+
+        return {
+            "total": len(ids),
+            "inserted": inserted,
+            "renamed": renamed,
+            "elapsed": time.perf_counter() - started,
+        }
+
     async def update_user(self, user_id, data: dict):
         """Обновляет любые поля пользователя"""
         await self.users.update_one({"_id": user_id}, {"$set": data})
+        self.cache.patch(user_id, set_fields=data)
+
+    async def bulk_add_xp(self, deltas: dict, usernames: dict = None):
+        """
+        Начисляет XP пачкой: один bulk_update из $inc с upsert (новые пользователи создаются).
+        deltas: {user_id: xp}, usernames: {user_id: username} для новых документов.
+        Возвращает документы после начисления: [{"_id", "xp", "level"}, ...]
+        """
+        if not deltas:
+            return []
+        usernames = usernames or {}
+        ops = []
+        for user_id, amount in deltas.items():
+            ops.append((
+                {"_id": user_id},
+                {"$inc": {"xp": amount}, "$setOnInsert": self._insert_defaults(user_id, usernames.get(user_id))},
+                True
+            ))
+        await self.users.bulk_update(ops)
+        self.xp_writes += 1
+        docs = await self.users.find({"_id": {"$in": list(deltas)}}, {"xp": 1, "level": 1})
+        for doc in docs:
+            self.cache.patch(doc["_id"], set_fields={"xp": doc.get("xp", 0)})
+        return docs
+
+    def _insert_defaults(self, user_id, username):
+        """Поля нового документа для $setOnInsert (без xp — его меняет $inc)"""
+        defaults = self.new_user_doc(user_id, username)
+        del defaults["_id"], defaults["xp"]
+        return defaults
+
+    async def add_xp(self, user_id, amount: int, username=None):
+        """
+        Атомарно начисляет XP ($inc в find_one_and_update) и поднимает уровень.
+        Отрицательный amount снимает XP, но не ниже 0 (уровень не понижается).
+        Возвращает (документ после изменения, список пройденных уровней).
+        """
+        if amount < 0:
+            await self.take_xp(user_id, -amount)
+            return await self.find_user(user_id), []
+
+        user = await self.users.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"xp": amount}, "$setOnInsert": self._insert_defaults(user_id, username)},
+            upsert=True,
+            return_after=True,
+        )
+        self.xp_writes += 1
+        self.cache.invalidate(user_id)
+        crossed = (await self.apply_level_ups([user])).get(user_id, [])
+        if crossed:
+            user["level"] = crossed[-1]
+        return user, crossed
+
+    async def take_xp(self, user_id, amount: int):
+        """Атомарно снимает до amount XP (не ниже 0). Возвращает, сколько реально сняли."""
+        if amount <= 0:
+            return 0
+        user = await self.users.find_one_and_update(
+            {"_id": user_id, "xp": {"$gte": amount}},
+            {"$inc": {"xp": -amount}},
+            projection={"xp": 1},
+        )
+        if user:
+            self.xp_writes += 1
+            self.cache.patch(user_id, inc_fields={"xp": -amount})
+            return amount
+        # XP меньше, чем просят — забираем все, что есть
+        user = await self.users.find_one_and_update(
+            {"_id": user_id, "xp": {"$gt": 0, "$lt": amount}},
+            {"$set": {"xp": 0}},
+            projection={"xp": 1},
+        )
+        if not user:
+            return 0
+        self.xp_writes += 1
+        self.cache.patch(user_id, set_fields={"xp": 0})
+        return user["xp"]
+
+    async def top_users(self, limit):
+        """Первые limit пользователей по XP (идет по индексу xp_desc, без сортировки в памяти)"""
+        return await self.users.find({}, {"username": 1, "xp": 1, "level": 1}, sort=[("xp", -1), ("_id", 1)], limit=limit)
+
+    async def count_xp_above(self, xp):
+        """Сколько пользователей набрали больше xp (счет по диапазону индекса xp_desc)"""
+        return await self.users.count({"xp": {"$gt": xp}})
+
+    async def apply_level_ups(self, users):
+        """
+        Пересчитывает уровни по XP (бинарный поиск по порогам) для документов [{"_id", "xp", "level"}].
+        Уровень пишется условным обновлением (только если он вырос), поэтому параллельные
+        начисления не сообщат об одном повышении дважды.
+        Возвращает {user_id: [пройденные уровни]} только для тех, кто повысился.
+        """
+        result = {}
+        for user in users:
+            old_level = user.get("level", 0)
+            new_level = level_for_xp(user.get("xp", 0))
+            if new_level <= old_level:
+                continue
+            before = await self.users.find_one_and_update(
+                {"_id": user["_id"], "level": {"$lt": new_level}},
+                {"$set": {"level": new_level}},
+                projection={"level": 1},
+            )
+            if before:
+                self.cache.patch(user["_id"], set_fields={"level": new_level})
+                result[user["_id"]] = levels_crossed(before.get("level", 0), new_level)
+        return result
 
     async def add_item(self, user_id: int, item_id: str, amount: int):
         """Добавляет предмет (или отнимает, если amount < 0)"""
+        # Новый пользователь создается с полями по умолчанию (inventory собирает $inc)
+        defaults = self.new_user_doc(user_id, None)
+        del defaults["_id"], defaults["inventory"]
         await self.users.update_one(
             {"_id": user_id},
-            {"$inc": {f"inventory.{item_id}": amount}},
+            {"$inc": {f"inventory.{item_id}": amount}, "$setOnInsert": defaults},
             upsert=True
         )
+        self.cache.patch(user_id, inc_fields={f"inventory.{item_id}": amount})
+    async def claim_rewards(self, user_id, levels: list, items: dict):
+        """
+        Забирает награды за levels одним атомарным обновлением: $inc предметов + $bit or в rewards_mask.
+        Срабатывает, только если ни один из levels еще не получен ($bitsAllClear) — повторный клик ничего не выдаст.
+        Документ без rewards_mask (создан в обход миграции) считается маской 0.
+        items: {item_id: amount}. Возвращает True, если награды выданы.
+        """
+        if not levels:
+            return False
+        bits = Int64(rewards_mask(levels))
+        update = {"$bit": {"rewards_mask": {"or": bits}}}
+        if items:
+            update["$inc"] = {f"inventory.{item_id}": amount for item_id, amount in items.items()}
+        claimed = await self.users.update_one(
+            {"_id": user_id, "$or": [
+                {"rewards_mask": {"$bitsAllClear": bits}},
+                {"rewards_mask": {"$exists": False}},
+            ]},
+            update
+        )
+        self.cache.invalidate(user_id)
+        return claimed
+
+    async def save_boost(self, user_id, since, until, multiplier):
+        """Сохраняет буст XP, чтобы он пережил перезапуск"""
+        await self.update_user(user_id, {"boost": {"since": since, "until": until, "multiplier": multiplier}})
+
+    async def active_boosts(self, after):
+        """Бусты, которые действуют после момента after: [{"_id", "boost": {"since", "until", "multiplier"}}]"""
+        return await self.users.find({"boost.until": {"$gt": after}}, PROJECTIONS["boost"])
+
     async def toggle_setting(self, user_id, setting_key):
         """Переключает настройку (True <-> False) и возвращает новое состояние"""
-        user = await self.find_user(user_id)
+        user = await self.find_user(user_id, "settings")
         
         # Получаем текущие настройки (по умолчанию пустой словарь)
         settings = user.get("settings", {'lang': 'ru', 'ephermal': True})
@@ -58,13 +376,21 @@ class DatabaseManager:
             {"_id": user_id},
             {"$set": {f"settings.{setting_key}": new_value}}
         )
+        self.cache.patch(user_id, set_fields={f"settings.{setting_key}": new_value})
         
         return new_value
 
     async def get_settings(self, user_id):
         """Возвращает словарь настроек"""
-        user = await self.find_user(user_id)
+        user = await self.find_user(user_id, "settings")
         if not user: return {}
         return user.get("settings", {})
+
+    async def get_settings_many(self, user_ids):
+        """Настройки сразу нескольких пользователей одним запросом: {user_id: settings}"""
+        if not user_ids:
+            return {}
+        docs = await self.users.find({"_id": {"$in": list(user_ids)}}, PROJECTIONS["settings"])
+        return {doc["_id"]: doc.get("settings", {}) for doc in docs}
 # Создаем экземпляр, который будем импортировать в других файлах
 db = DatabaseManager()
\ No newline at end of file
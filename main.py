@@ -3,9 +3,14 @@ import discord
 import os
 import asyncio
 from discord.ext import commands
-from settings import BOT_TOKEN
+from settings import BOT_TOKEN, PROGRESSBAR_PREWARM
 from aiohttp import web
 from utils.logger import log
+from utils.assets import assets
+from utils.avatars import avatars
+from utils.render_pool import renderer
+from utils.generator import Generator
+from database import db
 import datetime
 
 # Настройка намерений
@@ -19,6 +24,14 @@ class MyBot(commands.Bot):
         super().__init__(command_prefix="!", intents=intents)
 
     async def setup_hook(self):
+        # Декодируем картинки и шрифты один раз, до первых запросов
+        await asyncio.to_thread(assets.preload)
+        if PROGRESSBAR_PREWARM:
+            await asyncio.to_thread(Generator.warm_progressbars)
+        renderer.start()
+        # Открываем соединения с БД и создаем индексы заранее
+        await db.warm_up()
+
         # Загрузка когов
         for filename in os.listdir('./cogs'):
             if filename.endswith('.py'):
@@ -44,7 +57,11 @@ class MyBot(commands.Bot):
         else:
             log("Ког Leveling не найден, сохранения не будет.", level="ERROR")
         
-        # 3. Выключаем бота стандартным способом
+        # 3. Закрываем общую HTTP-сессию для аватарок
+        await avatars.close()
+        renderer.shutdown()
+
+        # 4. Выключаем бота стандартным способом
         await super().close()
 
 async def health_check(request):
@@ -27,6 +27,57 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 MONGO_URL = os.getenv('MONGO_URL')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
+# --- Аватарки ---
+AVATAR_CACHE_MB = int(os.getenv('AVATAR_CACHE_MB', 32))    # Лимит LRU-кэша готовых аватарок
+AVATAR_TIMEOUT = float(os.getenv('AVATAR_TIMEOUT', 3))     # Таймаут скачивания, сек
+
+# --- Генерация картинок ---
+RENDER_MODE = os.getenv('RENDER_MODE', 'thread')                             # thread | process
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', 16))                  # Сверх этого — "занято, повторите"
+RENDER_CACHE_MB = int(os.getenv('RENDER_CACHE_MB', 64))                      # Кэш готовых карточек в памяти
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', '')                         # Папка для сброса на диск, кэш живет в ее подпапке render_cache ('' = выкл.)
+RENDER_CACHE_DISK_MB = int(os.getenv('RENDER_CACHE_DISK_MB', 256))
+# Профиль кодирования карточек: png | png_fast | png_palette | webp_lossless | webp
+# (сравнить профили: python -m benchmarks.bench_encoding)
+ROADMAP_ENCODING = os.getenv('ROADMAP_ENCODING', 'png')
+BP_CARD_ENCODING = os.getenv('BP_CARD_ENCODING', 'png')
+# Построить все варианты прогресс-бара при старте (~20 МБ на процесс), иначе — по мере надобности
+PROGRESSBAR_PREWARM = os.getenv('PROGRESSBAR_PREWARM', 'False').lower() == 'true'
+
+# --- Начисление XP ---
+XP_FLUSH_INTERVAL = int(os.getenv('XP_FLUSH_INTERVAL', 30))  # Как часто сбрасывать накопленный XP в БД, сек
+XP_FLUSH_SIZE = int(os.getenv('XP_FLUSH_SIZE', 200))         # Сбросить раньше, если набралось столько пользователей
+XP_PER_MINUTE = float(os.getenv('XP_PER_MINUTE', 10))       # Базовая скорость в войсе
+# Ивентовые каналы: ID через запятую, XP в них умножается (AFK-канал сервера всегда дает 0)
+XP_EVENT_CHANNELS = [int(c) for c in os.getenv('XP_EVENT_CHANNELS', '').split(',') if c.strip()]
+XP_EVENT_MULTIPLIER = float(os.getenv('XP_EVENT_MULTIPLIER', 2))
+XP_BOOST_MULTIPLIER = float(os.getenv('XP_BOOST_MULTIPLIER', 2))  # Буст от Monster Energy
+XP_BOOST_HOURS = float(os.getenv('XP_BOOST_HOURS', 2))            # Длительность буста, ч
+# Журнал голосовых сессий: время в войсе переживает падение бота ('' = выкл.)
+VOICE_JOURNAL_PATH = os.getenv('VOICE_JOURNAL_PATH', os.path.join(BASE_DIR, 'data', 'voice_sessions.journal'))
+VOICE_JOURNAL_FSYNC = float(os.getenv('VOICE_JOURNAL_FSYNC', 2))      # Как часто сбрасывать журнал на диск, сек
+VOICE_JOURNAL_COMPACT = int(os.getenv('VOICE_JOURNAL_COMPACT', 5000)) # Сжимать журнал, когда в нем больше строк
+
+# --- Уведомления о повышении уровня (в CHANNEL_ID) ---
+ANNOUNCE_WINDOW = float(os.getenv('ANNOUNCE_WINDOW', 3))  # Сколько секунд копить повышения в одну сводку
+ANNOUNCE_RATE = int(os.getenv('ANNOUNCE_RATE', 4))        # Не больше стольких сообщений...
+ANNOUNCE_PER = float(os.getenv('ANNOUNCE_PER', 5))        # ...за столько секунд (лимит канала Discord — 5 за 5 с)
+
+# --- База данных ---
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')      # mongo | memory (без сервера, данные не сохраняются)
+MONGO_MAX_POOL = int(os.getenv('MONGO_MAX_POOL', 50))        # Максимум соединений в пуле
+MONGO_MIN_POOL = int(os.getenv('MONGO_MIN_POOL', 5))         # Сколько соединений держать открытыми всегда
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', 5000))  # Таймаут подключения/выбора сервера, мс
+MONGO_WARM_CONNECTIONS = int(os.getenv('MONGO_WARM_CONNECTIONS', 5))  # Сколько соединений открыть при старте
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))      # Сколько живет документ пользователя в кэше, сек (0 = выкл.)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 2000))    # Максимум пользователей в кэше
+SYNC_CHUNK_SIZE = int(os.getenv('SYNC_CHUNK_SIZE', 1000))    # Размер пачки в !sync_db
+
+# --- Таблица лидеров ---
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 10))    # Сколько мест показывать в /top
+LEADERBOARD_TTL = int(os.getenv('LEADERBOARD_TTL', 60))      # Как долго живут топ и места пользователей без записей XP, сек
+
 if BOT_TOKEN is None:
     raise ValueError("❌ ОШИБКА: BOT_TOKEN не найден в .env файле или файл не загрузился.")
 
@@ -71,3 +122,12 @@ def load_txt_file(filename):
 SYSTEM_PROMPT = load_txt_file('ai_system_prompt.txt')
 LEVELS = load_json_file('levels.json', key_is_int=True)
 ITEMS_DB = load_json_file('items_data.json', key_is_int=False)
+
+# Версия конфигов: растет при каждом горячем обновлении LEVELS/ITEMS_DB.
+# Кэши, зависящие от конфигов, используют ее как часть ключа.
+CONFIG_VERSION = 0
+
+def bump_config_version():
+    global CONFIG_VERSION
+    CONFIG_VERSION += 1
+    return CONFIG_VERSION
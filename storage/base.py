@@ -0,0 +1,58 @@
+class DuplicateKey(Exception):
+    """Документ с таким _id уже есть"""
+
+
+class StorageBackend:
+    """
+    Хранилище одной коллекции документов с семантикой MongoDB.
+    Фильтры: равенство, $in/$nin, $gt/$gte/$lt/$lte, $ne, $exists, $bitsAllClear/$bitsAllSet, пути через точку.
+    Обновления: $set, $setOnInsert, $inc, $unset, $bit, $addToSet; upsert.
+    Проекции — только включающие ({"field": 1}), _id возвращается всегда.
+    """
+
+    async def ping(self):
+        """Проверка связи"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def create_index(self, keys, **options):
+        raise NotImplementedError
+
+    async def drop(self):
+        """Удаляет все документы (для проверок и бенчмарков)"""
+        raise NotImplementedError
+
+    async def find_one(self, filter, projection=None):
+        raise NotImplementedError
+
+    async def find(self, filter, projection=None, sort=None, limit=0):
+        """Список документов. sort: [(поле, 1 | -1)], limit=0 — без ограничения"""
+        raise NotImplementedError
+
+    async def count(self, filter):
+        raise NotImplementedError
+
+    async def insert_one(self, doc):
+        """Вставляет документ, при совпадении _id бросает DuplicateKey"""
+        raise NotImplementedError
+
+    async def insert_many(self, docs):
+        """Вставка без порядка: дубликаты пропускаются. Возвращает число вставленных."""
+        raise NotImplementedError
+
+    async def update_one(self, filter, update, upsert=False):
+        """Возвращает True, если документ нашелся (или создан через upsert)"""
+        raise NotImplementedError
+
+    async def bulk_update(self, ops):
+        """
+        Пачка update_one без порядка за один запрос. ops: [(filter, update, upsert)].
+        Возвращает число найденных + созданных документов.
+        """
+        raise NotImplementedError
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False, return_after=False):
+        """Документ до (или после, если return_after) изменения; None, если ничего не нашлось"""
+        raise NotImplementedError
@@ -0,0 +1,225 @@
+"""
+Проверка, что хранилище ведет себя как MongoDB в тех операциях, которыми пользуется DatabaseManager.
+Один и тот же набор проверок гоняется на любом бэкенде:
+
+    python -m storage.conformance            # MemoryBackend
+    python -m storage.conformance mongo      # MongoBackend (MONGO_URL, коллекция conformance_users)
+"""
+from storage.base import DuplicateKey
+import asyncio
+import sys
+import traceback
+
+CHECKS = []
+
+
+def check(func):
+    CHECKS.append(func)
+    return func
+
+
+@check
+async def insert_and_find(s):
+    await s.insert_one({"_id": 1, "name": "a", "xp": 10, "inventory": {"box": 2}})
+    assert await s.find_one({"_id": 1}) == {"_id": 1, "name": "a", "xp": 10, "inventory": {"box": 2}}
+    assert await s.find_one({"_id": 2}) is None
+    assert await s.find_one({"_id": 1}, {"xp": 1}) == {"_id": 1, "xp": 10}
+    assert await s.find_one({"_id": 1}, {"inventory.box": 1}) == {"_id": 1, "inventory": {"box": 2}}
+
+
+@check
+async def returned_docs_are_copies(s):
+    await s.insert_one({"_id": 1, "inventory": {"box": 1}})
+    doc = await s.find_one({"_id": 1})
+    doc["inventory"]["box"] = 100
+    assert (await s.find_one({"_id": 1}))["inventory"]["box"] == 1
+
+
+@check
+async def duplicate_key(s):
+    await s.insert_one({"_id": 1})
+    try:
+        await s.insert_one({"_id": 1})
+    except DuplicateKey:
+        pass
+    else:
+        raise AssertionError("повторный _id не отклонен")
+
+
+@check
+async def insert_many_skips_duplicates(s):
+    await s.insert_one({"_id": 2})
+    assert await s.insert_many([{"_id": 1}, {"_id": 2}, {"_id": 3}]) == 2
+    assert await s.count({}) == 3
+    assert await s.insert_many([]) == 0
+
+
+@check
+async def set_and_inc_dotted(s):
+    await s.insert_one({"_id": 1, "xp": 5, "settings": {"lang": "ru"}})
+    assert await s.update_one({"_id": 1}, {"$set": {"settings.ephermal": False}, "$inc": {"xp": 3, "inventory.box": 2}})
+    assert await s.find_one({"_id": 1}) == {
+        "_id": 1, "xp": 8, "settings": {"lang": "ru", "ephermal": False}, "inventory": {"box": 2}
+    }
+    assert not await s.update_one({"_id": 2}, {"$inc": {"xp": 1}})
+    assert await s.find_one({"_id": 2}) is None
+
+
+@check
+async def upsert_with_set_on_insert(s):
+    update = {"$inc": {"xp": 10}, "$setOnInsert": {"level": 0, "username": "new"}}
+    assert await s.update_one({"_id": 1}, update, upsert=True)
+    assert await s.find_one({"_id": 1}) == {"_id": 1, "xp": 10, "level": 0, "username": "new"}
+    await s.update_one({"_id": 1, "level": 0}, {"$set": {"level": 3}})
+    assert await s.update_one({"_id": 1}, update, upsert=True)
+    # $setOnInsert не трогает существующий документ
+    assert await s.find_one({"_id": 1}) == {"_id": 1, "xp": 20, "level": 3, "username": "new"}
+
+
+@check
+async def unset(s):
+    await s.insert_one({"_id": 1, "old": [0, 1], "keep": 1})
+    await s.update_one({"_id": 1}, {"$unset": {"old": "", "missing": ""}})
+    assert await s.find_one({"_id": 1}) == {"_id": 1, "keep": 1}
+
+
+@check
+async def comparison_filters(s):
+    await s.insert_many([{"_id": i, "xp": i * 10} for i in range(1, 6)])
+    assert await s.count({"xp": {"$gt": 20}}) == 3
+    assert await s.count({"xp": {"$gte": 20, "$lt": 50}}) == 3
+    assert await s.count({"xp": {"$lte": 10}}) == 1
+    assert await s.count({"_id": {"$in": [1, 3, 9]}}) == 2
+    assert await s.count({"_id": {"$nin": [1, 3]}}) == 3
+    assert await s.count({"_id": 2, "xp": {"$gt": 100}}) == 0
+
+
+@check
+async def exists_filter(s):
+    await s.insert_many([{"_id": 1, "mask": 1}, {"_id": 2}])
+    assert [d["_id"] for d in await s.find({"mask": {"$exists": False}})] == [2]
+    assert [d["_id"] for d in await s.find({"mask": {"$exists": True}})] == [1]
+
+
+@check
+async def bit_operations(s):
+    await s.insert_one({"_id": 1, "mask": 1})
+    assert await s.update_one({"_id": 1, "mask": {"$bitsAllClear": 0b110}}, {"$bit": {"mask": {"or": 0b110}}})
+    assert (await s.find_one({"_id": 1}))["mask"] == 0b111
+    # Повторная попытка не проходит условие
+    assert not await s.update_one({"_id": 1, "mask": {"$bitsAllClear": 0b100}}, {"$bit": {"mask": {"or": 0b100}}})
+    assert await s.count({"mask": {"$bitsAllSet": 0b101}}) == 1
+
+
+@check
+async def or_filter(s):
+    # Отсутствующее поле маски — как 0 (документы, созданные до миграции)
+    await s.insert_many([{"_id": 1, "mask": 1}, {"_id": 2, "mask": 2}, {"_id": 3}])
+    only_clear = {"$or": [{"mask": {"$bitsAllClear": 1}}, {"mask": {"$exists": False}}]}
+    assert [d["_id"] for d in await s.find(only_clear, sort=[("_id", 1)])] == [2, 3]
+    assert await s.update_one({"_id": 3, **only_clear}, {"$bit": {"mask": {"or": 1}}})
+    assert (await s.find_one({"_id": 3}))["mask"] == 1
+
+
+@check
+async def find_sort_limit(s):
+    await s.insert_many([{"_id": 1, "xp": 5}, {"_id": 2, "xp": 50}, {"_id": 3, "xp": 50}, {"_id": 4, "xp": 1}])
+    top = await s.find({}, {"xp": 1}, sort=[("xp", -1), ("_id", 1)], limit=3)
+    assert [d["_id"] for d in top] == [2, 3, 1]
+    assert len(await s.find({})) == 4
+
+
+@check
+async def find_one_and_update_before_after(s):
+    await s.insert_one({"_id": 1, "xp": 10, "level": 1})
+    before = await s.find_one_and_update({"_id": 1}, {"$inc": {"xp": 5}}, projection={"xp": 1})
+    assert before == {"_id": 1, "xp": 10}
+    after = await s.find_one_and_update({"_id": 1}, {"$inc": {"xp": 5}}, return_after=True)
+    assert after == {"_id": 1, "xp": 20, "level": 1}
+    assert await s.find_one_and_update({"_id": 1, "xp": {"$gte": 100}}, {"$inc": {"xp": -100}}) is None
+    created = await s.find_one_and_update(
+        {"_id": 2}, {"$inc": {"xp": 7}, "$setOnInsert": {"level": 0}}, upsert=True, return_after=True
+    )
+    assert created == {"_id": 2, "xp": 7, "level": 0}
+
+
+@check
+async def conditional_update_is_atomic(s):
+    # Параллельные условные обновления: повышение уровня засчитывается один раз
+    await s.insert_one({"_id": 1, "level": 0})
+    results = await asyncio.gather(*[
+        s.find_one_and_update({"_id": 1, "level": {"$lt": 5}}, {"$set": {"level": 5}})
+        for _ in range(10)
+    ])
+    assert sum(r is not None for r in results) == 1
+
+
+@check
+async def bulk_update(s):
+    await s.insert_one({"_id": 1, "xp": 1})
+    done = await s.bulk_update([
+        ({"_id": 1}, {"$inc": {"xp": 1}}, True),
+        ({"_id": 2}, {"$inc": {"xp": 5}, "$setOnInsert": {"level": 0}}, True),
+        ({"_id": 3}, {"$inc": {"xp": 5}}, False),
+    ])
+    assert done == 2
+    docs = await s.find({"_id": {"$in": [1, 2, 3]}}, sort=[("_id", 1)])
+    assert docs == [{"_id": 1, "xp": 2}, {"_id": 2, "xp": 5, "level": 0}]
+    assert await s.bulk_update([]) == 0
+
+
+@check
+async def user_cache_serves_projections(s):
+    # DatabaseManager поверх этого хранилища: промах с проекцией наполняет кэш
+    from database import DatabaseManager
+    from utils.user_cache import UserCache
+    manager = DatabaseManager(backend=s)
+    manager.cache = UserCache(ttl=30, size=10)
+    await s.insert_one({"_id": 1, "xp": 5, "level": 1, "inventory": {"box": 2}})
+    assert await manager.get_inventory(1) == {"box": 2}
+    assert await manager.get_progress(1) == {"_id": 1, "xp": 5, "level": 1}
+    assert await manager.get_inventory(1) == {"box": 2}
+    stats = manager.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1), stats
+
+
+async def run(storage):
+    """Прогоняет все проверки на чистом хранилище. Возвращает число проваленных."""
+    failed = 0
+    await storage.ping()
+    await storage.create_index([("xp", -1), ("_id", 1)], name="xp_desc")
+    for func in CHECKS:
+        await storage.drop()
+        try:
+            await func(storage)
+            print(f"✅ {func.__name__}")
+        except Exception:
+            failed += 1
+            print(f"❌ {func.__name__}\n{traceback.format_exc()}")
+    await storage.drop()
+    print(f"\n{len(CHECKS) - failed}/{len(CHECKS)} проверок пройдено")
+    return failed
+
+
+def make_storage(name):
+    if name == "memory":
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    if name == "mongo":
+        from settings import MONGO_URL
+        from storage.mongo import MongoBackend
+        return MongoBackend(MONGO_URL, 'Main_Database', 'conformance_users', serverSelectionTimeoutMS=5000)
+    raise SystemExit(f"Неизвестное хранилище: {name} (memory | mongo)")
+
+
+async def main(name):
+    storage = make_storage(name)
+    try:
+        return await run(storage)
+    finally:
+        await storage.close()
+
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else "memory"
+    sys.exit(1 if asyncio.run(main(name)) else 0)
@@ -0,0 +1,284 @@
+from storage.base import StorageBackend, DuplicateKey
+from bson import ObjectId
+import asyncio
+import copy
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    """Значение по пути 'a.b.c' или _MISSING"""
+    for key in path.split('.'):
+        if not isinstance(doc, dict) or key not in doc:
+            return _MISSING
+        doc = doc[key]
+    return doc
+
+
+def _parent(doc, path, create=True):
+    """Родительский словарь и последний ключ для пути 'a.b.c'"""
+    *parents, last = path.split('.')
+    for key in parents:
+        if key not in doc:
+            if not create:
+                return None, last
+            doc[key] = {}
+        doc = doc[key]
+        if not isinstance(doc, dict):
+            raise TypeError(f"Поле '{key}' в пути '{path}' не является документом")
+    return doc, last
+
+
+def _compare(op):
+    def check(value, arg):
+        if value is _MISSING or value is None:
+            return False
+        try:
+            return op(value, arg)
+        except TypeError:
+            # Как в Mongo: значения разных типов между собой не сравниваются
+            return False
+    return check
+
+
+def _equals(value, arg):
+    if isinstance(value, list) and not isinstance(arg, list):
+        return arg in value
+    if value is _MISSING:
+        return arg is None
+    return value == arg
+
+
+def _in(value, arg):
+    if isinstance(value, list):
+        return any(v in arg for v in value)
+    return (None if value is _MISSING else value) in arg
+
+
+def _bits(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+OPERATORS = {
+    "$eq": _equals,
+    "$ne": lambda value, arg: not _equals(value, arg),
+    "$gt": _compare(lambda a, b: a > b),
+    "$gte": _compare(lambda a, b: a >= b),
+    "$lt": _compare(lambda a, b: a < b),
+    "$lte": _compare(lambda a, b: a <= b),
+    "$in": _in,
+    "$nin": lambda value, arg: not _in(value, arg),
+    "$exists": lambda value, arg: (value is not _MISSING) == bool(arg),
+    "$bitsAllClear": lambda value, arg: _bits(value) and value & arg == 0,
+    "$bitsAllSet": lambda value, arg: _bits(value) and value & arg == arg,
+}
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and cond and all(k.startswith('$') for k in cond)
+
+
+def matches(doc, filter):
+    """Подходит ли документ под фильтр"""
+    for path, cond in filter.items():
+        if path == "$or":
+            if not any(matches(doc, branch) for branch in cond):
+                return False
+            continue
+        value = _get(doc, path)
+        if _is_operator_dict(cond):
+            for op, arg in cond.items():
+                check = OPERATORS.get(op)
+                if check is None:
+                    raise NotImplementedError(f"Оператор фильтра {op} не поддерживается")
+                if not check(value, arg):
+                    return False
+        elif not _equals(value, cond):
+            return False
+    return True
+
+
+def apply_update(doc, update, inserting=False):
+    """Применяет операторы обновления к документу (на месте)"""
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                parent, key = _parent(doc, path)
+                parent[key] = copy.deepcopy(arg)
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$inc":
+                parent, key = _parent(doc, path)
+                current = parent.get(key, 0)
+                if not isinstance(current, (int, float)) or isinstance(current, bool):
+                    raise TypeError(f"$inc по нечисловому полю '{path}'")
+                parent[key] = current + arg
+            elif op == "$unset":
+                parent, key = _parent(doc, path, create=False)
+                if parent is not None:
+                    parent.pop(key, None)
+            elif op == "$bit":
+                parent, key = _parent(doc, path)
+                current = parent.get(key, 0)
+                if not _bits(current):
+                    raise TypeError(f"$bit по нецелому полю '{path}'")
+                for bit_op, mask in arg.items():
+                    if bit_op == "or":
+                        current |= mask
+                    elif bit_op == "and":
+                        current &= mask
+                    elif bit_op == "xor":
+                        current ^= mask
+                    else:
+                        raise NotImplementedError(f"$bit {bit_op} не поддерживается")
+                parent[key] = current
+            elif op == "$addToSet":
+                parent, key = _parent(doc, path)
+                current = parent.setdefault(key, [])
+                if not isinstance(current, list):
+                    raise TypeError(f"$addToSet по полю '{path}', которое не массив")
+                values = arg["$each"] if _is_operator_dict(arg) else [arg]
+                for value in values:
+                    if value not in current:
+                        current.append(copy.deepcopy(value))
+            else:
+                raise NotImplementedError(f"Оператор обновления {op} не поддерживается")
+
+
+def project(doc, projection):
+    """Копия документа только с нужными полями (включающая проекция)"""
+    if not projection:
+        return copy.deepcopy(doc)
+    result = {"_id": doc["_id"]} if projection.get("_id", 1) else {}
+    for path, include in projection.items():
+        if path == "_id" or not include:
+            continue
+        value = _get(doc, path)
+        if value is not _MISSING:
+            parent, key = _parent(result, path)
+            parent[key] = copy.deepcopy(value)
+    return result
+
+
+def _sort_key(path):
+    def key(doc):
+        value = _get(doc, path)
+        # Отсутствующие поля — раньше любых значений, как null в Mongo
+        return (0, 0) if value is _MISSING or value is None else (1, value)
+    return key
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Хранилище в памяти процесса с той же семантикой, что и MongoBackend.
+    Для запуска бота и бенчмарков без сервера MongoDB; данные не сохраняются.
+    latency — искусственная задержка каждой операции, сек (имитация сети).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._docs = {}  # {_id: документ}
+
+    async def _io(self):
+        # Каждая операция отдает управление event loop, как настоящий сетевой вызов
+        await asyncio.sleep(self.latency)
+
+    def _select(self, filter):
+        # Поиск по _id — прямой доступ, как по индексу _id
+        _id = filter.get("_id")
+        if _id is not None and not isinstance(_id, dict):
+            candidates = [self._docs.get(_id)]
+        elif isinstance(_id, dict) and list(_id) == ["$in"]:
+            candidates = [self._docs.get(i) for i in dict.fromkeys(_id["$in"])]
+        else:
+            return [doc for doc in self._docs.values() if matches(doc, filter)]
+        return [doc for doc in candidates if doc is not None and matches(doc, filter)]
+
+    def _upsert_doc(self, filter, update):
+        doc = {path: copy.deepcopy(cond) for path, cond in filter.items()
+               if '.' not in path and not _is_operator_dict(cond)}
+        doc.setdefault("_id", ObjectId())
+        apply_update(doc, update, inserting=True)
+        self._docs[doc["_id"]] = doc
+        return doc
+
+    def _update_one(self, filter, update, upsert):
+        """(документ до, документ после) или (None, None); синхронно — атомарно для event loop"""
+        found = self._select(filter)
+        if found:
+            doc = found[0]
+            # Меняем копию и подменяем целиком: при ошибке документ остается прежним
+            changed = copy.deepcopy(doc)
+            apply_update(changed, update)
+            self._docs[doc["_id"]] = changed
+            return doc, changed
+        if upsert:
+            return None, self._upsert_doc(filter, update)
+        return None, None
+
+    async def ping(self):
+        await self._io()
+
+    async def create_index(self, keys, **options):
+        # Индексы в памяти не нужны: _id — словарь, остальное — полный перебор
+        await self._io()
+
+    async def drop(self):
+        await self._io()
+        self._docs.clear()
+
+    async def find_one(self, filter, projection=None):
+        await self._io()
+        found = self._select(filter)
+        return project(found[0], projection) if found else None
+
+    async def find(self, filter, projection=None, sort=None, limit=0):
+        await self._io()
+        docs = self._select(filter)
+        for path, direction in reversed(sort or []):
+            docs.sort(key=_sort_key(path), reverse=direction < 0)
+        if limit:
+            docs = docs[:limit]
+        return [project(doc, projection) for doc in docs]
+
+    async def count(self, filter):
+        await self._io()
+        return len(self._select(filter))
+
+    async def insert_one(self, doc):
+        await self._io()
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            raise DuplicateKey(doc["_id"])
+        self._docs[doc["_id"]] = doc
+
+    async def insert_many(self, docs):
+        await self._io()
+        inserted = 0
+        for doc in docs:
+            doc = copy.deepcopy(doc)
+            doc.setdefault("_id", ObjectId())
+            if doc["_id"] not in self._docs:
+                self._docs[doc["_id"]] = doc
+                inserted += 1
+        return inserted
+
+    async def update_one(self, filter, update, upsert=False):
+        await self._io()
+        _, after = self._update_one(filter, update, upsert)
+        return after is not None
+
+    async def bulk_update(self, ops):
+        await self._io()
+        done = 0
+        for filter, update, upsert in ops:
+            _, after = self._update_one(filter, update, upsert)
+            done += after is not None
+        return done
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False, return_after=False):
+        await self._io()
+        before, after = self._update_one(filter, update, upsert)
+        doc = after if return_after else before
+        return project(doc, projection) if doc is not None else None
@@ -0,0 +1,80 @@
+import motor.motor_asyncio
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from storage.base import StorageBackend, DuplicateKey
+
+# Код ошибки MongoDB "duplicate key"
+DUPLICATE_KEY_CODE = 11000
+
+
+class MongoBackend(StorageBackend):
+    """Коллекция MongoDB через Motor"""
+
+    def __init__(self, url, database, collection, **client_options):
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(url, **client_options)
+        self.collection = self.client[database][collection]
+
+    async def ping(self):
+        await self.client.admin.command("ping")
+
+    async def close(self):
+        self.client.close()
+
+    async def create_index(self, keys, **options):
+        await self.collection.create_index(keys, **options)
+
+    async def drop(self):
+        await self.collection.delete_many({})
+
+    async def find_one(self, filter, projection=None):
+        return await self.collection.find_one(filter, projection)
+
+    async def find(self, filter, projection=None, sort=None, limit=0):
+        cursor = self.collection.find(filter, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def count(self, filter):
+        return await self.collection.count_documents(filter)
+
+    async def insert_one(self, doc):
+        try:
+            await self.collection.insert_one(doc)
+        except DuplicateKeyError as e:
+            raise DuplicateKey(doc.get("_id")) from e
+
+    async def insert_many(self, docs):
+        if not docs:
+            return 0
+        try:
+            result = await self.collection.insert_many(docs, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Дубликаты пропускаем, остальные ошибки — наверх
+            if any(err.get("code") != DUPLICATE_KEY_CODE for err in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
+
+    async def update_one(self, filter, update, upsert=False):
+        result = await self.collection.update_one(filter, update, upsert=upsert)
+        return result.matched_count > 0 or result.upserted_id is not None
+
+    async def bulk_update(self, ops):
+        if not ops:
+            return 0
+        result = await self.collection.bulk_write(
+            [UpdateOne(filter, update, upsert=upsert) for filter, update, upsert in ops],
+            ordered=False
+        )
+        return result.matched_count + result.upserted_count
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False, return_after=False):
+        return await self.collection.find_one_and_update(
+            filter, update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER if return_after else ReturnDocument.BEFORE,
+        )
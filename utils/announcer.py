@@ -0,0 +1,142 @@
+from database import db
+from settings import CHANNEL_ID, ANNOUNCE_WINDOW, ANNOUNCE_RATE, ANNOUNCE_PER
+from utils.logger import log
+from collections import deque
+import asyncio
+import discord
+import time
+
+MESSAGE_LIMIT = 2000  # Лимит длины сообщения Discord
+
+
+class LevelUpAnnouncer:
+    """
+    Очередь объявлений о повышении уровня. push() не ждет отправки: события копятся window секунд
+    и уходят сводками (несколько повышений — одно сообщение). Пользователи с выключенной
+    настройкой notify_lvl_up пропускаются. Отправка не чаще rate сообщений за per секунд —
+    в пределах лимита Discord на канал, поэтому бот не упирается в 429 и не ждет их.
+    """
+
+    def __init__(self, bot, channel_id=CHANNEL_ID, window=ANNOUNCE_WINDOW, rate=ANNOUNCE_RATE, per=ANNOUNCE_PER):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.window = window
+        self.rate = rate
+        self.per = per
+        self._pending = {}                  # {user_id: [пройденные уровни]} — по порядку поступления
+        self._sent_at = deque(maxlen=rate)  # Время последних отправок
+        self._task = None
+        self.sent = 0       # Сообщений отправлено
+        self.announced = 0  # Повышений объявлено
+        self.muted = 0      # Пропущено (уведомления выключены)
+
+    def push(self, user_id, crossed):
+        """Ставит повышение в очередь (не блокирует)"""
+        if not crossed:
+            return
+        self._pending.setdefault(user_id, []).extend(crossed)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self._pending:
+                # Ждем, пока соберутся события окна
+                await asyncio.sleep(self.window)
+                await self._send_pending()
+        except Exception as e:
+            log(f"Ошибка очереди уведомлений: {e}", level="ERROR")
+
+    def _requeue(self, pending):
+        """Возвращает неотправленное в начало очереди (перед тем, что пришло за это время)"""
+        for user_id, crossed in self._pending.items():
+            pending.setdefault(user_id, []).extend(crossed)
+        self._pending = pending
+
+    async def _send_pending(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        channel = self.bot.get_channel(self.channel_id)
+        if not channel:
+            return
+
+        # Все, что не дошло до channel.send (ошибка БД, отмена при выключении), вернется в очередь
+        unsent = dict(pending)
+        try:
+            settings = await db.get_settings_many(list(pending))
+            lines = []
+            for user_id, crossed in pending.items():
+                if not settings.get(user_id, {}).get("notify_lvl_up", True):
+                    self.muted += 1
+                    del unsent[user_id]
+                    continue
+                lines.append((user_id, self.format_line(user_id, crossed)))
+            for group in self.pack(lines):
+                await self._pace()
+                try:
+                    await channel.send("\n".join(line for _, line in group))
+                    self.sent += 1
+                    self.announced += len(group)
+                except discord.HTTPException as e:
+                    log(f"Не удалось отправить уведомление о повышении: {e}", level="WARN")
+                for user_id, _ in group:
+                    del unsent[user_id]
+        finally:
+            if unsent:
+                self._requeue(unsent)
+
+    async def _pace(self):
+        """Ждет, пока в окне per секунд освободится место под отправку"""
+        if len(self._sent_at) == self.rate:
+            wait = self._sent_at[0] + self.per - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._sent_at.append(time.monotonic())
+
+    @staticmethod
+    def format_line(user_id, crossed):
+        new_lvl = max(crossed)
+        if len(crossed) > 1:
+            return f"🎉 <@{user_id}> достиг уровня {new_lvl}! (+{len(crossed)} ур.)"
+        return f"🎉 <@{user_id}> достиг уровня {new_lvl}!"
+
+    @staticmethod
+    def pack(lines, limit=MESSAGE_LIMIT):
+        """Делит строки [(user_id, line)] на группы, каждая склеивается в сообщение не длиннее limit"""
+        groups, current, length = [], [], 0
+        for item in lines:
+            extra = len(item[1]) + (1 if current else 0)
+            if current and length + extra > limit:
+                groups.append(current)
+                current, length, extra = [], 0, len(item[1])
+            current.append(item)
+            length += extra
+        if current:
+            groups.append(current)
+        return groups
+
+    async def close(self, timeout=5):
+        """
+        Отправляет то, что осталось в очереди (при выключении бота).
+        Текущую отправку дожидаемся (а не отменяем), на все — не больше timeout секунд.
+        """
+        task, self._task = self._task, None
+        deadline = time.monotonic() + timeout
+        try:
+            if task is not None and not task.done():
+                await asyncio.wait_for(task, timeout)
+            if self._pending:
+                await asyncio.wait_for(self._send_pending(), max(0, deadline - time.monotonic()))
+        except Exception as e:
+            log(f"Уведомления о повышении не отправлены при выключении: {e!r}", level="WARN")
+        if self._pending:
+            log(f"При выключении не отправлено уведомлений о повышении: {len(self._pending)}", level="WARN")
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "announced": self.announced,
+            "muted": self.muted,
+        }
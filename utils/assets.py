@@ -0,0 +1,148 @@
+from PIL import Image, ImageFont
+from utils.logger import log
+import os
+import threading
+import time
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+
+# Картинки, которые грузим заранее: имя файла -> размер после ресайза (None = как есть)
+IMAGE_SPECS = {
+    'roadmap_bg.png': (900, 1300),
+    'battlepass_background.png': None,
+    'bar_empty.png': None,
+    'bar_full.png': None,
+}
+
+# Шрифты и размеры, которые используют карточки
+FONT_SPECS = {
+    'Gilroy-ExtraBold.ttf': (38, 48),
+    'Gilroy-Bold.ttf': (32,),
+    'Gilroy-Light.ttf': (28,),
+}
+
+# Как часто (в секундах) проверять, не изменились ли файлы ассетов на диске
+RELOAD_CHECK_INTERVAL = 5
+
+
+class AssetRegistry:
+    """
+    Реестр ассетов на весь процесс.
+    Картинки декодируются и ресайзятся один раз, шрифты кэшируются по (имя, размер).
+    Если файл на диске поменялся — запись перечитывается при следующем обращении.
+    """
+
+    def __init__(self, assets_dir=ASSETS_DIR):
+        self.assets_dir = assets_dir
+        self.version = 0  # Растет при каждой перезагрузке ассетов (нужно для зависимых кэшей)
+        self._lock = threading.RLock()
+        self._images = {}  # {(name, size): Image}
+        self._fonts = {}   # {(name, size): FreeTypeFont}
+        self._mtimes = {}  # {path: mtime}
+        self._last_check = 0.0
+
+    def _image_path(self, name):
+        return os.path.join(self.assets_dir, 'images', name)
+
+    def _font_path(self, name):
+        return os.path.join(self.assets_dir, 'fonts', name)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _load_image(self, name, size):
+        path = self._image_path(name)
+        img = Image.open(path).convert("RGBA")
+        if size and img.size != tuple(size):
+            img = img.resize(size)
+        img.load()
+        self._mtimes[path] = self._mtime(path)
+        return img
+
+    def _load_font(self, name, size):
+        path = self._font_path(name)
+        try:
+            font = ImageFont.truetype(path, size)
+            self._mtimes[path] = self._mtime(path)
+            return font
+        except (OSError, IOError):
+            log(f"Шрифт {name} не найден по пути {path}. Использую стандартный.", level='WARN')
+            # mtime None (файла нет): когда шрифт появится, check_reload сбросит заглушку
+            self._mtimes[path] = self._mtime(path)
+            return ImageFont.load_default()
+
+    def preload(self):
+        """Загружает все известные ассеты. Вызывается один раз при старте."""
+        started = time.perf_counter()
+        with self._lock:
+            for name, size in IMAGE_SPECS.items():
+                try:
+                    self._images[(name, size)] = self._load_image(name, size)
+                except (OSError, IOError) as e:
+                    log(f"Ассет {name} не загружен: {e}", level='WARN')
+            for name, sizes in FONT_SPECS.items():
+                for size in sizes:
+                    self._fonts[(name, size)] = self._load_font(name, size)
+            self._last_check = time.monotonic()
+        log(f"Ассеты загружены за {(time.perf_counter() - started) * 1000:.1f} мс "
+            f"(картинок: {len(self._images)}, шрифтов: {len(self._fonts)})", level='INFO')
+
+    def check_reload(self, force=False):
+        """Сбрасывает записи, чьи файлы изменились на диске. Проверка не чаще RELOAD_CHECK_INTERVAL."""
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._last_check = now
+            changed = {path for path, mtime in self._mtimes.items() if self._mtime(path) != mtime}
+            if not changed:
+                return
+            for path in changed:
+                self._mtimes.pop(path, None)
+            self._images = {k: v for k, v in self._images.items() if self._image_path(k[0]) not in changed}
+            self._fonts = {k: v for k, v in self._fonts.items() if self._font_path(k[0]) not in changed}
+            self.version += 1
+        log(f"Ассеты изменились на диске, перечитываю: {', '.join(os.path.basename(p) for p in changed)}", level='INFO')
+
+    def get_image(self, name, size=None, copy=True):
+        """
+        Возвращает декодированную картинку.
+        copy=True — отдает копию, на которой можно рисовать; copy=False — общий объект только для чтения.
+        Если size не указан, берется размер из IMAGE_SPECS.
+        Бросает FileNotFoundError, если файла нет.
+        """
+        if size is None:
+            size = IMAGE_SPECS.get(name)
+        key = (name, tuple(size) if size else None)
+        self.check_reload()
+        img = self._images.get(key)
+        if img is None:
+            with self._lock:
+                img = self._images.get(key)
+                if img is None:
+                    img = self._load_image(name, key[1])
+                    self._images[key] = img
+        return img.copy() if copy else img
+
+    def get_font(self, name, size):
+        """Возвращает шрифт из кэша (или грузит его один раз)."""
+        key = (name, size)
+        self.check_reload()
+        font = self._fonts.get(key)
+        if font is None:
+            with self._lock:
+                font = self._fonts.get(key)
+                if font is None:
+                    font = self._load_font(name, size)
+                    self._fonts[key] = font
+        return font
+
+
+# Один реестр на процесс
+assets = AssetRegistry()
@@ -0,0 +1,83 @@
+from PIL import Image
+from utils.logger import log
+from utils.masks import circle_avatar, circle_cache
+from settings import AVATAR_TIMEOUT
+import aiohttp
+import asyncio
+import hashlib
+import io
+
+
+def url_hash(url):
+    """Короткий ключ для кэша по URL аватарки (в URL Дискорда уже зашит хэш картинки)"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class AvatarService:
+    """
+    Загрузка аватарок на event loop через одну общую aiohttp-сессию.
+    Готовые круглые аватарки хранятся в utils/masks.circle_cache (LRU по байтам).
+    Генератор получает уже готовую картинку и в сеть не ходит.
+    """
+
+    def __init__(self, timeout=AVATAR_TIMEOUT):
+        self.timeout = timeout
+        self._session = None
+        self._inflight = {}  # {(url_hash, size): Future} — одинаковые запросы ждут одну загрузку
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    @staticmethod
+    def _decode(data, size, avatar_hash=None):
+        """Декодирует и обрезает аватарку в круг (выполняется в потоке)"""
+        return circle_avatar(Image.open(io.BytesIO(data)), size, avatar_hash)
+
+    async def _fetch(self, url, size, avatar_hash):
+        session = self._get_session()
+        async with session.get(url) as response:
+            if response.status != 200:
+                log(f"Аватарка не скачалась ({response.status}): {url}", level='WARN')
+                return None
+            data = await response.read()
+        return await asyncio.to_thread(self._decode, data, size, avatar_hash)
+
+    async def get(self, url, size):
+        """Возвращает круглую аватарку size x size или None, если скачать не удалось"""
+        if not url:
+            return None
+        avatar_hash = url_hash(url)
+        key = (avatar_hash, size)
+
+        cached = circle_cache.get(key)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        avatar = None
+        try:
+            avatar = await self._fetch(url, size, avatar_hash)
+        except Exception as e:
+            log(f"Ошибка загрузки аватара: {e}", level='ERROR')
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(avatar)
+        return avatar
+
+
+# Один сервис на процесс
+avatars = AvatarService()
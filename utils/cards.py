@@ -0,0 +1,115 @@
+import settings
+from settings import LEVELS, ROADMAP_ENCODING, BP_CARD_ENCODING
+from utils.assets import assets
+from utils.avatars import avatars, url_hash
+from utils.generator import Generator, generate_image_in_thread
+from utils.render_pool import renderer, RenderBusy
+from utils.render_cache import render_cache
+from utils.logger import log
+import asyncio
+import io
+
+# Дискорд отдает аватарки степенями двойки — 256 хватает для кружков 100/130px
+AVATAR_FETCH_SIZE = 256
+
+# Сколько страниц в roadmap
+ROADMAP_PAGES = 3
+
+# Имена файлов для discord.File (расширение зависит от профиля кодирования)
+ROADMAP_FILENAME = f"roadmap.{Generator.file_extension(ROADMAP_ENCODING)}"
+BP_CARD_FILENAME = f"battlepass.{Generator.file_extension(BP_CARD_ENCODING)}"
+
+
+def avatar_url(user):
+    """URL уменьшенной аватарки пользователя"""
+    return user.display_avatar.with_size(AVATAR_FETCH_SIZE).url
+
+
+def next_level_xp(level, current_xp):
+    """
+    Порог XP следующего уровня. На последнем уровне — текущий XP (полоса заполнена).
+    Все места, рисующие roadmap, берут need_xp отсюда: он входит в ключ кэша.
+    """
+    return LEVELS.get(level + 1, {}).get('exp_need', current_xp)
+
+
+def _versions():
+    """(версия конфигов, версия ассетов). При попадании в кэш картинка не рисуется,
+    поэтому изменения ассетов на диске проверяем здесь (не чаще RELOAD_CHECK_INTERVAL)."""
+    assets.check_reload()
+    return settings.CONFIG_VERSION, assets.version
+
+
+def roadmap_key(user, current_xp, need_xp, level, page):
+    """Все, от чего зависит картинка roadmap"""
+    return ("roadmap", user.id, user.name, url_hash(avatar_url(user)),
+            level, current_xp, need_xp, page, *_versions(), ROADMAP_ENCODING)
+
+
+def bp_card_key(user, level, current_xp, need_xp):
+    """Все, от чего зависит карточка баттлпасса"""
+    return ("bp", user.id, user.name, url_hash(avatar_url(user)),
+            level, current_xp, need_xp, *_versions(), BP_CARD_ENCODING)
+
+
+_background_tasks = set()
+
+
+async def _render_roadmap_page(user, current_xp, need_xp, level, page):
+    async def render():
+        avatar = await avatars.get(avatar_url(user), Generator.ROADMAP_AVATAR_SIZE)
+        buffer = await generate_image_in_thread(
+            Generator.create_roadmap, user.name, avatar,
+            current_xp, need_xp, level, page, LEVELS, settings.CONFIG_VERSION, ROADMAP_ENCODING
+        )
+        return buffer.getvalue() if buffer is not None else None
+
+    return await render_cache.get_or_render(roadmap_key(user, current_xp, need_xp, level, page), render)
+
+
+async def _prerender_pages(user, current_xp, need_xp, level, pages):
+    """Фоновая отрисовка соседних страниц. Если рендер занят — просто пропускаем."""
+    for page in pages:
+        if render_cache.peek(roadmap_key(user, current_xp, need_xp, level, page)):
+            continue
+        if renderer.queue_depth > 0:
+            return
+        try:
+            await _render_roadmap_page(user, current_xp, need_xp, level, page)
+        except RenderBusy:
+            return
+        except Exception as e:
+            log(f"Ошибка фоновой отрисовки roadmap (стр. {page}): {e}", level="WARN")
+            return
+
+
+async def render_roadmap(user, current_xp, need_xp, level, page, prerender=False):
+    """
+    Скачивает аватарку на event loop и рисует страницу roadmap в потоке.
+    Повторные запросы с тем же состоянием отдаются из render_cache.
+    prerender=True — после ответа в фоне рисует остальные страницы, чтобы листание было мгновенным.
+    """
+    data = await _render_roadmap_page(user, current_xp, need_xp, level, page)
+    if data is None:
+        return None
+
+    if prerender:
+        # Сначала ближайшие страницы, потом дальние
+        others = sorted((p for p in range(1, ROADMAP_PAGES + 1) if p != page), key=lambda p: abs(p - page))
+        task = asyncio.create_task(_prerender_pages(user, current_xp, need_xp, level, others))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return io.BytesIO(data)
+
+
+async def render_bp_card(user, level, current_xp, need_xp):
+    """Скачивает аватарку на event loop и рисует карточку баттлпасса в потоке (с кэшем по состоянию)"""
+    async def render():
+        avatar = await avatars.get(avatar_url(user), Generator.BP_AVATAR_SIZE)
+        buffer = await generate_image_in_thread(
+            Generator.create_bp_card, user.name, level, current_xp, need_xp, avatar, BP_CARD_ENCODING
+        )
+        return buffer.getvalue() if buffer is not None else None
+
+    data = await render_cache.get_or_render(bp_card_key(user, level, current_xp, need_xp), render)
+    return io.BytesIO(data) if data is not None else None
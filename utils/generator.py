@@ -1,40 +1,90 @@
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageDraw
 from utils.logger import log
-import requests
+from utils.assets import assets
+from utils.render_pool import renderer
+from utils.masks import make_circle
 import io
-import asyncio
-import os
+import threading
 import traceback
 
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
-
-
 async def generate_image_in_thread(func, *args, **kwargs):
-    """Универсальная обертка для запуска Pillow в отдельном потоке"""
-    return await asyncio.to_thread(func, *args, **kwargs)
+    """
+    Универсальная обертка для запуска Pillow вне event loop.
+    Поток или процесс выбирается настройкой RENDER_MODE (см. utils/render_pool.py).
+    Если очередь переполнена — бросает RenderBusy.
+    """
+    return await renderer.submit(func, *args, **kwargs)
+
+# Профили кодирования готовых карточек: имя -> (формат, параметры save())
+ENCODING_PROFILES = {
+    "png": ("PNG", {}),                                   # Как раньше (zlib level 6)
+    "png_fast": ("PNG", {"compress_level": 1}),           # Быстрее кодируется, файл больше
+    "png_palette": ("PNG", {"compress_level": 6}),        # 256 цветов — сильно меньше файл
+    "webp_lossless": ("WEBP", {"lossless": True, "quality": 0, "method": 1}),
+    "webp": ("WEBP", {"quality": 90, "method": 4}),
+}
+PALETTE_PROFILES = {"png_palette"}
+
 
 class Generator:
+    # Размеры круглых аватарок на карточках
+    ROADMAP_AVATAR_SIZE = 130
+    BP_AVATAR_SIZE = 100
+
+    # Общий лок для кэшей готовых слоев (рендер идет из нескольких потоков)
+    _layers_lock = threading.Lock()
 
     @staticmethod
-    def make_circle(img):
-        """маска аватарки/картинка/чего угодно"""
-        mask = Image.new('L', img.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0) + img.size, fill=255)
-        output = ImageOps.fit(img, mask.size, centering=(0.5, 0.5))
-        output.putalpha(mask)
-        return output
+    def make_circle(img, size=None):
+        """маска аватарки/картинка/чего угодно (сглаженная маска из utils/masks.py)"""
+        return make_circle(img, size)
     
 
 
 
+    # --- ПРОГРЕСС-БАР: готовые полосы по ширине заливки ---
+    # Ширина заливки квантуется с шагом PROGRESSBAR_STEP px (на 700px полосе это < 0.6%)
+    PROGRESSBAR_STEP = 4
+    _progressbars = {}  # {(bar_empty, bar_full, fill_width, assets_version): Image}
+
+    @staticmethod
+    def _build_progressbar(bar_empty, bar_full, fill_width):
+        base = assets.get_image(bar_empty)
+        if fill_width > 0:
+            full_gradient = assets.get_image(bar_full, copy=False)
+            cropped_gradient = full_gradient.crop((0, 0, fill_width, base.height))
+            base.paste(cropped_gradient, (0, 0), mask=cropped_gradient)
+        return base
+
+    @staticmethod
+    def warm_progressbars(bar_empty='bar_empty.png', bar_full='bar_full.png'):
+        """Заранее строит все варианты полосы (вызывать при старте, если не жалко ~20 МБ)"""
+        width = assets.get_image(bar_empty, copy=False).width
+        for fill_width in range(0, width + 1, Generator.PROGRESSBAR_STEP):
+            Generator._get_progressbar(bar_empty, bar_full, fill_width)
+        Generator._get_progressbar(bar_empty, bar_full, width)
+
+    @staticmethod
+    def _get_progressbar(bar_empty, bar_full, fill_width):
+        key = (bar_empty, bar_full, fill_width, assets.version)
+        bar = Generator._progressbars.get(key)
+        if bar is None:
+            bar = Generator._build_progressbar(bar_empty, bar_full, fill_width)
+            with Generator._layers_lock:
+                # Ассеты перечитались — старые полосы больше не нужны
+                for old_key in [k for k in Generator._progressbars if k[3] != assets.version]:
+                    del Generator._progressbars[old_key]
+                Generator._progressbars[key] = bar
+        return bar
+
     @staticmethod
     def get_progressbar(current_xp: int, max_xp: int, bar_empty: str, bar_full: str):
-            bar_empty_path = os.path.join(ASSETS_DIR, 'images', bar_empty)
+            """
+            Полоса прогресса из кэша. Возвращает общий объект — его можно вставлять, но не изменять.
+            """
             try:
-                base = Image.open(bar_empty_path).convert("RGBA").copy()
+                full_width = assets.get_image(bar_empty, copy=False).width
             except Exception as e:
                 log(f'Ошибка в создани в получении ассета {bar_empty}\n{e}', level='ERROR')
                 print(traceback.format_exc())
@@ -43,123 +93,183 @@ class Generator:
             if max_xp == 0: max_xp = 1
             percent = current_xp / max_xp
             if percent > 1: percent = 1
-            if percent <= 0: return base 
 
-            full_width, height = base.size
-            fill_width = int(full_width * percent)
-            if fill_width < 1: fill_width = 1
+            if percent <= 0:
+                fill_width = 0
+            elif percent >= 1:
+                fill_width = full_width
+            else:
+                step = Generator.PROGRESSBAR_STEP
+                fill_width = max(1, int(full_width * percent) // step * step)
 
-            bar_full_path = os.path.join(ASSETS_DIR, 'images', bar_full)
             try:
-                full_gradient = Image.open(bar_full_path).convert("RGBA")
-                cropped_gradient = full_gradient.crop((0, 0, fill_width, height))
-                base.paste(cropped_gradient, (0, 0), mask=cropped_gradient)
+                return Generator._get_progressbar(bar_empty, bar_full, fill_width)
             except Exception as e:
                 log(f'Ошибка в создани в получении ассета {bar_full}\n{e}', level='ERROR')
                 print(traceback.format_exc())
                 return
-            return base
-    
+
+    @staticmethod
+    def file_extension(encoding):
+        """Расширение файла для профиля кодирования"""
+        fmt, _ = ENCODING_PROFILES.get(encoding, ENCODING_PROFILES["png"])
+        return fmt.lower()
+
+    @staticmethod
+    def encode(img, encoding="png"):
+        """Кодирует картинку по профилю из ENCODING_PROFILES и возвращает BytesIO"""
+        if encoding not in ENCODING_PROFILES:
+            log(f"Неизвестный профиль кодирования {encoding}, использую png", level="WARN")
+            encoding = "png"
+        fmt, params = ENCODING_PROFILES[encoding]
+        if encoding in PALETTE_PROFILES:
+            img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+        output_buffer = io.BytesIO()
+        img.save(output_buffer, format=fmt, **params)
+        output_buffer.seek(0)
+        return output_buffer
+
     @staticmethod
     def get_font(name, size):
-        """Безопасная загрузка шрифта. Если нет файла, берет стандартный."""
-        path = os.path.join(ASSETS_DIR, 'fonts', name)
-        try:
-            return ImageFont.truetype(path, size)
-        except (OSError, IOError):
-            log(f"Шрифт {name} не найден по пути {path}. Использую стандартный.", level='WARN')
-            return ImageFont.load_default()
+        """Безопасная загрузка шрифта из реестра. Если нет файла, берет стандартный."""
+        return assets.get_font(name, size)
+
+    # --- ROADMAP: статичный слой страницы + оверлей пользователя ---
+    ROADMAP_SIZE = (900, 1300)
+    ROADMAP_START_Y = 250
+    ROADMAP_STEP_Y = 95
+    ROADMAP_LINE_X = 105
+    ROADMAP_CIRCLE_R = 30
+
+    # {(page, config_version, assets_version): Image} — фон, номер страницы и описания наград
+    _roadmap_layers = {}
+    # {(lvl_num, color, assets_version): Image} — кружок уровня с номером
+    _roadmap_badges = {}
 
     @staticmethod
-    def create_roadmap(username, avatar_url, current_xp, need_xp, level, page, all_levels):
-        # Убедись, что пути к assets/ правильные
-        
-        try:
-            # --- ОТЛАДКА ---
-            log(f"Начало генерации Roadmap для {username}...", level='DEBUG')
+    def clear_static_layers():
+        """Сбрасывает кэш статичных слоев (после горячего обновления LEVELS)"""
+        with Generator._layers_lock:
+            Generator._roadmap_layers.clear()
 
-            W, H = 900, 1300
-            
-            # 1. ФОН
-            bg_path = os.path.join(ASSETS_DIR, 'images', 'roadmap_bg.png')
-            try:
-                bg = Image.open(bg_path).convert("RGBA").resize((W, H))
-            except FileNotFoundError:
-                log(f"Фон не найден: {bg_path}", level="WARN")
-                bg = Image.new('RGB', (W, H), color='#2b2d31') # Темно-серый фон
+    @staticmethod
+    def _build_roadmap_layer(page, all_levels):
+        """Рисует общую для всех часть страницы: фон, PAGE N и описания наград"""
+        W, H = Generator.ROADMAP_SIZE
+        try:
+            bg = assets.get_image('roadmap_bg.png', (W, H))
+        except FileNotFoundError:
+            log("Фон не найден: roadmap_bg.png", level="WARN")
+            bg = Image.new('RGBA', (W, H), color='#2b2d31') # Темно-серый фон
+
+        draw = ImageDraw.Draw(bg)
+        font_head = Generator.get_font("Gilroy-ExtraBold.ttf", 48)
+        font_sub = Generator.get_font("Gilroy-Bold.ttf", 32)
+
+        draw.text((720, 50), f"PAGE {page}", font=font_head, fill="#aaaaaa")
+
+        start_lvl = (page - 1) * 10
+        line_x = Generator.ROADMAP_LINE_X
+        for i in range(11):
+            lvl_num = start_lvl + i
+            y = Generator.ROADMAP_START_Y + (i * Generator.ROADMAP_STEP_Y)
+
+            # Текст награды
+            lvl_data = all_levels.get(lvl_num) # all_levels здесь будет словарем int: dict
+            if lvl_data:
+                desc = lvl_data.get('desc', 'Награда')
+                draw.text((line_x + 50, y - 15), desc, font=font_sub, fill="white")
+            elif lvl_num == 0:
+                draw.text((line_x + 50, y - 15), "НАЧАЛО", font=font_sub, fill="white")
+            else:
+                draw.text((line_x + 50, y - 15), f"Уровень {lvl_num}", font=font_sub, fill="#777777")
+        return bg
 
-            draw = ImageDraw.Draw(bg)
+    @staticmethod
+    def _get_roadmap_layer(page, all_levels, config_version):
+        key = (page, config_version, assets.version)
+        layer = Generator._roadmap_layers.get(key)
+        if layer is None:
+            layer = Generator._build_roadmap_layer(page, all_levels)
+            with Generator._layers_lock:
+                # Старые версии конфига больше не понадобятся
+                for old_key in [k for k in Generator._roadmap_layers if k[1:] != key[1:]]:
+                    del Generator._roadmap_layers[old_key]
+                Generator._roadmap_layers[key] = layer
+        return layer.copy()
 
-            # 2. ШРИФТЫ (Убедись, что они есть в assets/fonts/ или используй стандартные)
-            font_head = Generator.get_font("Gilroy-ExtraBold.ttf", 48)
-            font_sub = Generator.get_font("Gilroy-Bold.ttf", 32)
+    @staticmethod
+    def _get_roadmap_badge(lvl_num, color):
+        """Кружок уровня с номером (r=30) на прозрачном фоне"""
+        key = (lvl_num, color, assets.version)
+        badge = Generator._roadmap_badges.get(key)
+        if badge is None:
+            r = Generator.ROADMAP_CIRCLE_R
+            badge = Image.new('RGBA', (2 * r + 1, 2 * r + 1), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(badge)
+            draw.ellipse((0, 0, 2 * r, 2 * r), fill=color)
             font_lvl = Generator.get_font("Gilroy-ExtraBold.ttf", 38)
+            w_text = draw.textlength(str(lvl_num), font=font_lvl)
+            draw.text((r - w_text/2, r - 20), str(lvl_num), font=font_lvl, fill="black")
+            with Generator._layers_lock:
+                # Кружки старых версий ассетов больше не понадобятся
+                for old_key in [k for k in Generator._roadmap_badges if k[2] != key[2]]:
+                    del Generator._roadmap_badges[old_key]
+                Generator._roadmap_badges[key] = badge
+        return badge
+
+    @staticmethod
+    def draw_roadmap(username, avatar, current_xp, need_xp, level, page, all_levels, config_version=0):
+        """
+        Рисует страницу roadmap и возвращает Image (без кодирования).
+        avatar — готовая круглая аватарка ROADMAP_AVATAR_SIZE (см. utils/avatars.py) или None.
+        config_version — версия LEVELS (settings.CONFIG_VERSION), ключ кэша статичного слоя.
+        """
+        # 1. СТАТИЧНЫЙ СЛОЙ (фон, номер страницы, описания наград) — из кэша
+        bg = Generator._get_roadmap_layer(page, all_levels, config_version)
+        draw = ImageDraw.Draw(bg)
+
+        font_head = Generator.get_font("Gilroy-ExtraBold.ttf", 48)
+        font_sub = Generator.get_font("Gilroy-Bold.ttf", 32)
+
+        # 2. АВАТАРКА (уже скачана и обрезана в круг)
+        if avatar is not None:
+            bg.paste(avatar, (40, 25), avatar)
+
+        # 3. ТЕКСТ
+        draw.text((190, 40), str(username), font=font_head, fill="white")
+        draw.text((190, 100), f"XP: {current_xp} / {need_xp}", font=font_sub, fill="#00ff7f")
+
+        # 4. КРУЖКИ УРОВНЕЙ (цвет зависит от уровня пользователя)
+        start_lvl = (page - 1) * 10
+        r = Generator.ROADMAP_CIRCLE_R
+        for i in range(11):
+            lvl_num = start_lvl + i
+            y = Generator.ROADMAP_START_Y + (i * Generator.ROADMAP_STEP_Y)
+
+            if lvl_num < level:
+                color = "#00ff7f" # Зеленый (получено)
+            elif lvl_num == level:
+                color = "#ffd700" # Желтый (текущий)
+            else:
+                color = "#444444" # Серый (закрыто)
+
+            badge = Generator._get_roadmap_badge(lvl_num, color)
+            bg.paste(badge, (Generator.ROADMAP_LINE_X - r, y - r), badge)
+        return bg
 
-            # 3. АВАТАРКА (Скачивание)
-            if avatar_url:
-                try:
-                    response = requests.get(avatar_url, timeout=2) # Таймаут 2 сек
-                    if response.status_code == 200:
-                        avatar_bytes = io.BytesIO(response.content)
-                        avatar = Image.open(avatar_bytes).convert("RGBA").resize((130, 130))
-                        
-                        # Круглая маска
-                        mask = Image.new('L', avatar.size, 0)
-                        ImageDraw.Draw(mask).ellipse((0, 0) + avatar.size, fill=255)
-                        avatar_circle = ImageOps.fit(avatar, mask.size, centering=(0.5, 0.5))
-                        avatar_circle.putalpha(mask)
-                        
-                        bg.paste(avatar_circle, (40, 25), avatar_circle)
-                except Exception as e:
-                    log(f"Ошибка загрузки аватара: {e}", level='ERROR')
-
-            # 4. ТЕКСТ
-            draw.text((190, 40), str(username), font=font_head, fill="white")
-            draw.text((190, 100), f"XP: {current_xp} / {need_xp}", font=font_sub, fill="#00ff7f")
-            draw.text((720, 50), f"PAGE {page}", font=font_head, fill="#aaaaaa")
-
-            # 5. СПИСОК УРОВНЕЙ (Логика отрисовки)
-            start_lvl = (page - 1) * 10
-            start_y = 250
-            step_y = 95
-            line_x = 105
-
-            text_left_margin = line_x + 50
-            for i in range(11):
-                lvl_num = start_lvl + i  
-                y = start_y + (i * step_y)
-                
-                # Цвет кружка
-                if lvl_num < level:
-                    color = "#00ff7f" # Зеленый (получено)
-                elif lvl_num == level:
-                    color = "#ffd700" # Желтый (текущий)
-                else:
-                    color = "#444444" # Серый (закрыто)
-
-                # Рисуем кружок
-                r = 30
-                draw.ellipse((line_x-r, y-r, line_x+r, y+r), fill=color)
-                
-                # Номер уровня
-                w_text = draw.textlength(str(lvl_num), font=font_lvl)
-                draw.text((line_x - w_text/2, y - 20), str(lvl_num), font=font_lvl, fill="black")
-
-                # Текст награды
-                lvl_data = all_levels.get(lvl_num) # all_levels здесь будет словарем int: dict
-                if lvl_data:
-                    desc = lvl_data.get('desc', 'Награда')
-                    draw.text((line_x + 50, y - 15), desc, font=font_sub, fill="white")
-                else:
-                    if lvl_num == 0:
-                        draw.text((text_left_margin, y - 15), "НАЧАЛО", font=font_sub, fill="white")
-                    else:
-                        draw.text((line_x + 50, y - 15), f"Уровень {lvl_num}", font=font_sub, fill="#777777")
+    @staticmethod
+    def create_roadmap(username, avatar, current_xp, need_xp, level, page, all_levels, config_version=0, encoding="png"):
+        """Рисует страницу roadmap и кодирует ее по профилю encoding. Возвращает BytesIO или None."""
+        try:
+            # --- ОТЛАДКА ---
+            log(f"Начало генерации Roadmap для {username}...", level='DEBUG')
+
+            bg = Generator.draw_roadmap(username, avatar, current_xp, need_xp, level, page, all_levels, config_version)
 
             # --- СОХРАНЕНИЕ ---
-            output_buffer = io.BytesIO()
-            bg.save(output_buffer, format="PNG")
-            output_buffer.seek(0)
+            output_buffer = Generator.encode(bg, encoding)
             
             log("Генерация завершена успешно.", level='SUCCESS')
             return output_buffer
@@ -168,18 +278,14 @@ class Generator:
             log(f"❌ КРИТИЧЕСКАЯ ОШИБКА В ГЕНЕРАТОРЕ:\n{e}", level='ERROR')
             print(traceback.format_exc()) # Выведет полный текст ошибки
             return None # Вернем None, чтобы бот знал об ошибке
-        
-
 
     @staticmethod
-    def create_bp_card(username, level, current_xp, max_xp, avatar_url):
-        """Генерирует боевого пропуска для пользователя"""
-        bg_path = os.path.join(ASSETS_DIR, 'images', 'battlepass_background.png')
+    def draw_bp_card(username, level, current_xp, max_xp, avatar):
+        """Рисует карточку боевого пропуска и возвращает Image (или None, если нет фона)"""
         try:
-            log(f'Загружен ассет {bg_path}', level="DEBUG")
-            background = Image.open(bg_path).convert("RGBA")
+            background = assets.get_image('battlepass_background.png')
         except Exception as e:
-            log(f"Ассет {bg_path} не загружен, произошка ошибка:\n{e}", level="ERROR")
+            log(f"Ассет battlepass_background.png не загружен, произошка ошибка:\n{e}", level="ERROR")
             print(traceback.format_exc())
             return
         draw = ImageDraw.Draw(background)
@@ -201,31 +307,15 @@ class Generator:
         draw.text((321, 171), text, font=font_xp, fill="#003300") # Тень
         draw.text((320, 170), text, font=font_xp, fill="#FFFFFF") # Белый
 
-        # 5. Аватарка
-        if avatar_url:
-            try:
-                response = requests.get(avatar_url, timeout=5)
-                avatar_bytes = io.BytesIO(response.content)
-                avatar = Image.open(avatar_bytes).convert("RGBA")
-                avatar = avatar.resize((100, 100))
-                
-                # Делаем круг
-                avatar_circle = Generator.make_circle(avatar)
-                background.paste(avatar_circle, (30, 30), avatar_circle)
-                log(f'Аватарка пользователя {username} получена', level='DEBUG')
-            except Exception as e:
-                log(f'Ошибка загрузки аватарки пользователя {username}\n{e}', level='DEBUG')
-                print(traceback.format_exc())
-                return None
-
-        output_buffer = io.BytesIO()
-        background.save(output_buffer, format="PNG")
-        output_buffer.seek(0)
-        
+        # 5. Аватарка (уже скачана и обрезана в круг)
+        if avatar is not None:
+            background.paste(avatar, (30, 30), avatar)
+        return background
 
-        return output_buffer
-
-        
-        
-        
-    
\ No newline at end of file
+    @staticmethod
+    def create_bp_card(username, level, current_xp, max_xp, avatar, encoding="png"):
+        """Генерирует боевого пропуска для пользователя. avatar — круглая аватарка BP_AVATAR_SIZE или None"""
+        background = Generator.draw_bp_card(username, level, current_xp, max_xp, avatar)
+        if background is None:
+            return
+        return Generator.encode(background, encoding)
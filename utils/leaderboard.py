@@ -0,0 +1,64 @@
+from database import db
+from settings import LEADERBOARD_SIZE, LEADERBOARD_TTL
+import asyncio
+import time
+
+
+class Leaderboard:
+    """
+    Таблица лидеров поверх индекса xp_desc.
+    Топ хранится в памяти и перечитывается, когда прошло ttl секунд или в БД записали XP
+    (db.xp_writes), но не чаще раза в min_refresh секунд.
+    Место пользователя = 1 + число пользователей с большим XP; кэшируется по (user_id, xp) на ttl.
+    """
+
+    def __init__(self, size=LEADERBOARD_SIZE, ttl=LEADERBOARD_TTL, min_refresh=5):
+        self.size = size
+        self.ttl = ttl
+        self.min_refresh = min_refresh
+        self._top = []
+        self._top_at = 0.0
+        self._top_writes = -1
+        self._lock = asyncio.Lock()
+        self._ranks = {}  # {user_id: (xp, rank, expires_at)}
+
+    def _top_fresh(self):
+        age = time.monotonic() - self._top_at
+        if age >= self.ttl:
+            return False
+        return self._top_writes == db.xp_writes or age < self.min_refresh
+
+    async def top(self):
+        """[{"_id", "username", "xp", "level"}, ...] — первые size мест"""
+        if self._top_fresh():
+            return self._top
+        async with self._lock:
+            # Пока ждали блокировку, топ мог обновить соседний запрос
+            if not self._top_fresh():
+                writes = db.xp_writes
+                self._top = await db.top_users(self.size)
+                self._top_at = time.monotonic()
+                self._top_writes = writes
+        return self._top
+
+    async def rank(self, user_id, xp):
+        """Место пользователя с данным XP (одинаковый XP — одинаковое место)"""
+        cached = self._ranks.get(user_id)
+        now = time.monotonic()
+        if cached and cached[0] == xp and cached[2] > now:
+            return cached[1]
+
+        # Если пользователь в свежем топе — место уже известно
+        if self._top_fresh():
+            for doc in self._top:
+                if doc["_id"] == user_id and doc.get("xp", 0) == xp:
+                    return 1 + sum(1 for other in self._top if other.get("xp", 0) > xp)
+
+        rank = 1 + await db.count_xp_above(xp)
+        if len(self._ranks) > 10000:
+            self._ranks = {uid: v for uid, v in self._ranks.items() if v[2] > now}
+        self._ranks[user_id] = (xp, rank, now + self.ttl)
+        return rank
+
+
+leaderboard = Leaderboard()
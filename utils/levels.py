@@ -0,0 +1,58 @@
+import settings
+from settings import LEVELS
+from bisect import bisect_right
+
+_table = {}  # {config_version: (thresholds, levels)}
+
+
+def level_table():
+    """
+    Отсортированные пороги XP и номера уровней из LEVELS.
+    Строится один раз на версию конфига (settings.CONFIG_VERSION).
+    """
+    version = settings.CONFIG_VERSION
+    table = _table.get(version)
+    if table is None:
+        items = sorted(LEVELS.items())
+        # Порог не может быть меньше предыдущего — иначе бинарный поиск врет
+        thresholds, levels, top = [], [], 0
+        for lvl, data in items:
+            top = max(top, data.get('exp_need', 0))
+            thresholds.append(top)
+            levels.append(lvl)
+        table = (thresholds, levels)
+        _table.clear()
+        _table[version] = table
+    return table
+
+
+def level_for_xp(xp):
+    """Уровень для данного количества XP за O(log n)"""
+    thresholds, levels = level_table()
+    i = bisect_right(thresholds, xp)
+    return levels[i - 1] if i else 0
+
+
+def levels_crossed(old_level, new_level):
+    """Список пройденных уровней (old_level, new_level]"""
+    return list(range(old_level + 1, new_level + 1))
+
+
+# Полученные награды хранятся битовой маской: бит N = награда за уровень N получена.
+# Маска лежит в Mongo как int64, поэтому уровней с наградами может быть не больше 62.
+MAX_MASK_LEVEL = 62
+
+
+def rewards_mask(levels):
+    """Маска из списка уровней"""
+    mask = 0
+    for lvl in levels:
+        if not 0 <= lvl <= MAX_MASK_LEVEL:
+            raise ValueError(f"Уровень {lvl} не помещается в маску наград")
+        mask |= 1 << lvl
+    return mask
+
+
+def unclaimed_levels(mask, up_to):
+    """Уровни 1..up_to, чей бит в маске не выставлен"""
+    return [lvl for lvl in range(1, min(up_to, MAX_MASK_LEVEL) + 1) if not mask >> lvl & 1]
@@ -0,0 +1,99 @@
+from PIL import Image, ImageDraw, ImageOps
+from settings import AVATAR_CACHE_MB
+from collections import OrderedDict
+import functools
+import threading
+
+# Во сколько раз больше рисуем круг перед уменьшением (сглаживание краев)
+SUPERSAMPLE = 4
+
+
+@functools.lru_cache(maxsize=32)
+def circle_mask(size):
+    """
+    Сглаженная круглая маска 'L' размера size=(w, h).
+    Рисуется в SUPERSAMPLE раз крупнее и уменьшается с LANCZOS. Одна на размер — не изменять.
+    """
+    w, h = size
+    big = Image.new('L', (w * SUPERSAMPLE, h * SUPERSAMPLE), 0)
+    ImageDraw.Draw(big).ellipse((0, 0, w * SUPERSAMPLE - 1, h * SUPERSAMPLE - 1), fill=255)
+    return big.resize((w, h), Image.LANCZOS)
+
+
+class CircleCache:
+    """LRU готовых круглых аватарок по (хэш аватарки, размер), ограниченный по байтам. Потокобезопасный."""
+
+    def __init__(self, max_bytes=AVATAR_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # {(avatar_hash, size): Image}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _image_bytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key):
+        with self._lock:
+            img = self._items.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        size = self._image_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= self._image_bytes(old)
+            self._items[key] = img
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= self._image_bytes(evicted)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "memory_mb": round(self._bytes / 1024 / 1024, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+        }
+
+
+circle_cache = CircleCache()
+
+
+def make_circle(img, size=None):
+    """
+    Обрезает картинку в круг со сглаженным краем.
+    size — итоговый размер стороны (по умолчанию размер картинки); ресайз через LANCZOS.
+    """
+    target = (size, size) if size else img.size
+    output = ImageOps.fit(img.convert("RGBA"), target, method=Image.LANCZOS, centering=(0.5, 0.5))
+    output.putalpha(circle_mask(target))
+    return output
+
+
+def circle_avatar(img, size, avatar_hash=None):
+    """
+    Круглая аватарка size x size. Если указан avatar_hash — результат кладется в кэш по (avatar_hash, size).
+    В кэше не ищет: это делает вызывающий до скачивания (AvatarService.get), иначе промах считался бы дважды.
+    Возвращает общий объект — его можно вставлять, но не изменять.
+    """
+    output = make_circle(img, size)
+    if avatar_hash is not None:
+        circle_cache.put((avatar_hash, size), output)
+    return output
@@ -0,0 +1,182 @@
+from utils.logger import log
+from settings import RENDER_CACHE_MB, RENDER_CACHE_DIR, RENDER_CACHE_DISK_MB
+from collections import OrderedDict
+import asyncio
+import hashlib
+import glob
+import os
+
+
+def key_hash(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Кэш готовых картинок по визуальному состоянию (кто, аватарка, уровень, XP, страница, версия конфига).
+    Память — LRU с лимитом по байтам; вытесненное можно сбрасывать на диск (disk_dir).
+    Одинаковые запросы, которые уже рисуются, ждут один общий рендер.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_MB * 1024 * 1024,
+                 disk_dir=RENDER_CACHE_DIR, disk_max_bytes=RENDER_CACHE_DISK_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # Свой подкаталог внутри RENDER_CACHE_DIR: чужие файлы в нем не трогаем
+        self.disk_dir = os.path.join(disk_dir, "render_cache") if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()  # {key_hash: bytes}
+        self._memory_bytes = 0
+        self._disk = OrderedDict()    # {key_hash: size}
+        self._disk_bytes = 0
+        self._inflight = {}           # {key_hash: Future}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            # Версии конфигов после рестарта начинаются заново — старые файлы могут быть неактуальны.
+            # Удаляются только наши *.bin
+            os.makedirs(self.disk_dir, exist_ok=True)
+            for path in glob.glob(os.path.join(self.disk_dir, "*.bin")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _disk_path(self, h):
+        return os.path.join(self.disk_dir, f"{h}.bin")
+
+    def _spill(self, h, data):
+        """Пишет вытесненную из памяти картинку на диск (выполняется в потоке)"""
+        try:
+            with open(self._disk_path(h), 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            log(f"Не удалось сбросить картинку на диск: {e}", level="WARN")
+            return False
+        return True
+
+    def _disk_evict(self):
+        """Выбрасывает самые старые файлы сверх лимита. Возвращает пути для удаления."""
+        removed = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            h, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            removed.append(self._disk_path(h))
+        return removed
+
+    def _memory_put(self, h, data):
+        """Кладет картинку в память. Возвращает список вытесненных (h, data) для сброса на диск."""
+        if len(data) > self.max_bytes:
+            return []
+        old = self._memory.pop(h, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[h] = data
+        self._memory_bytes += len(data)
+
+        spilled = []
+        while self._memory_bytes > self.max_bytes:
+            old_h, old_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_data)
+            if self.disk_dir and old_h not in self._disk:
+                spilled.append((old_h, old_data))
+        return spilled
+
+    async def _put(self, h, data):
+        spilled = self._memory_put(h, data)
+        if not spilled:
+            return
+        written = await asyncio.to_thread(lambda: [(sh, len(sd)) for sh, sd in spilled if self._spill(sh, sd)])
+        for sh, size in written:
+            self._disk[sh] = size
+            self._disk_bytes += size
+        removed = self._disk_evict()
+        if removed:
+            await asyncio.to_thread(_remove_files, removed)
+
+    async def _disk_get(self, h):
+        if h not in self._disk:
+            return None
+        self._disk.move_to_end(h)
+        try:
+            return await asyncio.to_thread(_read_file, self._disk_path(h))
+        except OSError:
+            self._disk_bytes -= self._disk.pop(h, 0)
+            return None
+
+    def peek(self, key):
+        """Есть ли картинка в памяти (без рендера)"""
+        return key_hash(key) in self._memory
+
+    async def get_or_render(self, key, render):
+        """
+        Возвращает bytes картинки по ключу.
+        render — корутинная функция без аргументов, которая рисует картинку и возвращает bytes или None.
+        Рендер идет в отдельной задаче: отмена одного запроса (таймаут interaction) не отменяет
+        его для остальных, кто ждет ту же картинку.
+        """
+        h = key_hash(key)
+
+        data = self._memory.get(h)
+        if data is not None:
+            self._memory.move_to_end(h)
+            self.hits += 1
+            return data
+
+        data = await self._disk_get(h)
+        if data is not None:
+            self.disk_hits += 1
+            await self._put(h, data)
+            return data
+
+        task = self._inflight.get(h)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.create_task(self._render(h, render))
+        # Если все ждущие отменены — не ругаемся "Task exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[h] = task
+        return await asyncio.shield(task)
+
+    async def _render(self, h, render):
+        try:
+            data = await render()
+            if data is not None:
+                await self._put(h, data)
+            return data
+        finally:
+            self._inflight.pop(h, None)
+
+    def stats(self):
+        return {
+            "items": len(self._memory),
+            "memory_mb": round(self._memory_bytes / 1024 / 1024, 1),
+            "disk_items": len(self._disk),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "shared": self.shared,
+            "misses": self.misses,
+        }
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Один кэш на процесс бота
+render_cache = RenderCache()
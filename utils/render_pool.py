@@ -0,0 +1,113 @@
+from utils.logger import log
+from settings import RENDER_MODE, RENDER_WORKERS, RENDER_QUEUE_SIZE
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import functools
+import multiprocessing
+import time
+
+
+class RenderBusy(Exception):
+    """Очередь генерации переполнена — запрос нужно повторить позже"""
+
+
+BUSY_MESSAGE = "⏳ Генератор картинок сейчас перегружен, попробуйте через пару секунд."
+
+
+def _init_worker():
+    """Инициализация процесса-воркера: ассеты грузим один раз на процесс"""
+    from utils.assets import assets
+    from utils.generator import Generator
+    from settings import PROGRESSBAR_PREWARM
+    assets.preload()
+    if PROGRESSBAR_PREWARM:
+        Generator.warm_progressbars()
+
+
+class RenderExecutor:
+    """
+    Исполнитель генерации картинок.
+    mode="thread"  — пул потоков (Pillow делит GIL с ботом)
+    mode="process" — пул процессов, каждый воркер заранее грузит ассеты
+    Очередь ограничена: если заданий больше, чем workers + queue_size, сразу бросаем RenderBusy.
+    """
+
+    def __init__(self, mode=RENDER_MODE, workers=RENDER_WORKERS, queue_size=RENDER_QUEUE_SIZE):
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+
+        # Счетчики
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=500)  # Последние времена выполнения (сек)
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        log(f"Рендер запущен: mode={self.mode}, workers={self.workers}, queue={self.queue_size}", level="INFO")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self):
+        """Сколько заданий ждут свободного воркера"""
+        return max(0, self.in_flight - self.workers)
+
+    async def submit(self, func, *args, **kwargs):
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise RenderBusy(BUSY_MESSAGE)
+        self.start()
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._latencies.append(time.perf_counter() - started)
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies: return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "p50_ms": round(pct(0.50), 1),
+            "p95_ms": round(pct(0.95), 1),
+        }
+
+
+# Один исполнитель на процесс бота
+renderer = RenderExecutor()
@@ -3,9 +3,12 @@ import random
 import asyncio
 from discord import ui, app_commands
 from database import db
-from settings import ITEMS_DB, LEVELS, LOG_CHANNEL_ID
-from utils.generator import Generator, generate_image_in_thread
+from settings import ITEMS_DB, LEVELS, LOG_CHANNEL_ID, XP_BOOST_MULTIPLIER
+from utils.cards import render_roadmap, next_level_xp, ROADMAP_PAGES, ROADMAP_FILENAME
+from utils.render_pool import RenderBusy
 from utils.logger import log
+from utils.leaderboard import leaderboard
+from utils.levels import unclaimed_levels
 import traceback
 
 # ==========================================
@@ -20,8 +23,8 @@ class InventoryLogic:
         if not interaction.response.is_done():
             await interaction.response.defer(thinking=True, ephemeral=True)
 
-        user_data = await db.find_user(interaction.user.id)
-        current_amount = user_data.get("inventory", {}).get(item_id, 0)
+        inventory = await db.get_inventory(interaction.user.id) or {}
+        current_amount = inventory.get(item_id, 0)
 
         if current_amount <= 0:
             return await interaction.followup.send(f"❌ Предмет закончился!")
@@ -32,8 +35,8 @@ class InventoryLogic:
                 return await interaction.followup.send("🤖 На роботов нельзя.")
             
             # Проверка щита у цели
-            target_data = await db.find_user(target.id)
-            if target_data and target_data.get('inventory', {}).get('shield', 0) > 0:
+            target_inv = await db.get_inventory(target.id)
+            if target_inv and target_inv.get('shield', 0) > 0:
                 await db.add_item(target.id, 'shield', -1)
                 await db.add_item(interaction.user.id, item_id, -1)
                 return await interaction.channel.send(f"🛡️ **{target.display_name}** отразил атаку **{interaction.user.display_name}** щитом!")
@@ -80,23 +83,26 @@ class InventoryLogic:
             elif item_id == "steal_xp":
                 if target:
                     if random.choice([True, False]):
-                        target_xp = (await db.find_user(target.id)).get('xp', 0)
-                        steal = min(target_xp, 500)
+                        # Атомарно: снимаем сколько есть (до 500) и столько же начисляем вору
+                        steal = await db.take_xp(target.id, 500)
                         if steal > 0:
-                            await db.update_user(target.id, {"xp": target_xp - steal})
-                            await db.update_user(interaction.user.id, {"xp": user_data['xp'] + steal})
+                            _, crossed = await db.add_xp(interaction.user.id, steal)
+                            await InventoryLogic.notify_level_up(interaction, crossed)
                             msg = f"🔪 **{interaction.user.name}** украл {steal} XP у **{target.display_name}**!"
                             success = True
                         else: return await interaction.followup.send("У него нет XP.")
                     else:
                         fine = 300
-                        await db.update_user(interaction.user.id, {"xp": max(0, user_data['xp'] - fine)})
+                        await db.take_xp(interaction.user.id, fine)
                         msg = f"🚓 **{interaction.user.name}** пойман при краже! Штраф {fine} XP."
                         success = True
 
             elif item_id == "xp_boost":
-                await db.update_user(interaction.user.id, {"xp": user_data['xp'] + 1000})
-                msg = f"⚡ **{interaction.user.name}** получил +1000 XP!"
+                leveling_cog = interaction.client.get_cog('Leveling')
+                if not leveling_cog:
+                    return await interaction.followup.send("❌ Начисление XP сейчас недоступно.")
+                until = await leveling_cog.start_boost(interaction.user.id)
+                msg = f"⚡ **{interaction.user.name}** выпил Monster Energy: x{XP_BOOST_MULTIPLIER:g} XP в войсе до <t:{int(until)}:t>!"
                 success = True
             
             elif item_id in ["shield", "ticket_tg", "ticket_nitro", "color_ticket"]:
@@ -113,6 +119,13 @@ class InventoryLogic:
             await db.add_item(interaction.user.id, item_id, -1)
             await interaction.followup.send(msg)
 
+    @staticmethod
+    async def notify_level_up(interaction, crossed):
+        """Передает повышение уровня в ког Leveling (там живут уведомления)"""
+        leveling_cog = interaction.client.get_cog('Leveling')
+        if crossed and leveling_cog:
+            await leveling_cog.notify_level_up(interaction.user.id, crossed)
+
     @staticmethod
     async def unmute_later(member):
         await asyncio.sleep(300)
@@ -275,8 +288,7 @@ class ProfileView(ui.View):
         if interaction.user.id != self.user_id:
             return await interaction.response.send_message("Это не твой профиль!", ephemeral=True)
 
-        user = await db.find_user(self.user_id)
-        inventory = user.get("inventory", {})
+        inventory = await db.get_inventory(self.user_id) or {}
         actual_items = {k: v for k, v in inventory.items() if v > 0}
 
         if not actual_items:
@@ -292,19 +304,19 @@ class ProfileView(ui.View):
             return await interaction.response.send_message("Это не твой профиль!", ephemeral=True)
 
         await interaction.response.defer(thinking=True, ephemeral=True)
-        user = await db.find_user(self.user_id)
+        user = await db.get_progress(self.user_id) or {}
         lvl = user.get('level', 0)
         if lvl == 0: lvl = 1
         page = 2 if lvl > 10 else 1
         if lvl > 20: page = 3
-        need_xp = LEVELS.get(lvl + 1, {}).get('exp_need', 99999)
+        need_xp = next_level_xp(lvl, user.get('xp', 0))
 
-        buffer = await generate_image_in_thread(
-            Generator.create_roadmap, interaction.user.name, interaction.user.display_avatar.url,
-            user.get('xp', 0), need_xp, lvl, page, LEVELS
-        )
+        try:
+            buffer = await render_roadmap(interaction.user, user.get('xp', 0), need_xp, lvl, page, prerender=True)
+        except RenderBusy as e:
+            return await interaction.followup.send(str(e), ephemeral=True)
         if buffer:
-            file = discord.File(fp=buffer, filename="roadmap.png")
+            file = discord.File(fp=buffer, filename=ROADMAP_FILENAME)
             view = RoadmapPagination(interaction.user, page, user)
             await interaction.followup.send(file=file, view=view, ephemeral=True)
 
@@ -414,7 +426,7 @@ class SettingsView(ui.View):
         try:
             await interaction.response.defer(thinking=True, ephemeral=True)
             log("[Profile] Defer отправлен.", level="DEBUG")
-            db_user = await db.find_user(interaction.user.id)
+            db_user = await db.find_user(interaction.user.id, "profile")
             if not db_user:
                 log(f"[Profile] Пользователь {interaction.user.name} не найден в БД.", level="WARN")
                 # Создаем временную структуру, чтобы команда не упала
@@ -454,6 +466,8 @@ class SettingsView(ui.View):
             embed.add_field(name="⭐ Уровень", value=f"**{lvl}**", inline=True)
             embed.add_field(name="📊 Опыт", value=f"`{xp} / {next_lvl_xp}` ({progress_percent}%)", inline=True)
             embed.add_field(name="📅 Участник сервера с", value=reg_date_str, inline=True)
+            if db_user:
+                embed.add_field(name="🏆 Место", value=f"**#{await leaderboard.rank(interaction.user.id, xp)}**", inline=True)
             
             embed.add_field(name="🎒 Инвентарь (Топ)", value=inv_str, inline=False)
             
@@ -479,16 +493,18 @@ class RoadmapPagination(ui.View):
 
     def update_buttons(self):
         self.children[0].disabled = (self.page <= 1)
-        self.children[1].disabled = (self.page >= 3) 
+        self.children[1].disabled = (self.page >= ROADMAP_PAGES)
 
     async def update_image(self, interaction):
         await interaction.response.defer()
-        need_xp = LEVELS.get(self.user_data['level'] + 1, {}).get('exp_need', 99999)
-        buffer = await generate_image_in_thread(
-            Generator.create_roadmap, self.user.name, self.user.display_avatar.url,
-            self.user_data['xp'], need_xp, self.user_data['level'], self.page, LEVELS
-        )
-        file = discord.File(fp=buffer, filename="roadmap.png")
+        # Те же значения, что и при первой отрисовке — тогда страница берется из render_cache
+        lvl = self.user_data.get('level', 0) or 1
+        need_xp = next_level_xp(lvl, self.user_data.get('xp', 0))
+        try:
+            buffer = await render_roadmap(self.user, self.user_data.get('xp', 0), need_xp, lvl, self.page)
+        except RenderBusy as e:
+            return await interaction.followup.send(str(e), ephemeral=True)
+        file = discord.File(fp=buffer, filename=ROADMAP_FILENAME)
         await interaction.message.edit(attachments=[file], view=self)
 
     @ui.button(label="◀️", style=discord.ButtonStyle.secondary)
@@ -520,8 +536,7 @@ class BattlepassView(ui.View):
         if interaction.user.id != self.user_id:
             return await interaction.response.send_message("Это не твой профиль!", ephemeral=True)
 
-        user = await db.find_user(self.user_id)
-        inventory = user.get("inventory", {})
+        inventory = await db.get_inventory(self.user_id) or {}
         actual_items = {k: v for k, v in inventory.items() if v > 0}
 
         if not actual_items:
@@ -537,19 +552,19 @@ class BattlepassView(ui.View):
             return await interaction.response.send_message("Это не твой профиль!", ephemeral=True)
 
         await interaction.response.defer(thinking=True, ephemeral=True)
-        user = await db.find_user(self.user_id)
+        user = await db.get_progress(self.user_id) or {}
         lvl = user.get('level', 0)
         if lvl == 0: lvl = 1
         page = 2 if lvl > 10 else 1
         if lvl > 20: page = 3
-        need_xp = LEVELS.get(lvl + 1, {}).get('exp_need', 99999)
+        need_xp = next_level_xp(lvl, user.get('xp', 0))
 
-        buffer = await generate_image_in_thread(
-            Generator.create_roadmap, interaction.user.name, interaction.user.display_avatar.url,
-            user.get('xp', 0), need_xp, lvl, page, LEVELS
-        )
+        try:
+            buffer = await render_roadmap(interaction.user, user.get('xp', 0), need_xp, lvl, page, prerender=True)
+        except RenderBusy as e:
+            return await interaction.followup.send(str(e), ephemeral=True)
         if buffer:
-            file = discord.File(fp=buffer, filename="roadmap.png")
+            file = discord.File(fp=buffer, filename=ROADMAP_FILENAME)
             view = RoadmapPagination(interaction.user, page, user)
             await interaction.followup.send(file=file, view=view, ephemeral=True)
 
@@ -560,48 +575,54 @@ class BattlepassView(ui.View):
             
         await interaction.response.defer(thinking=True, ephemeral=True)
         
-        user = await db.find_user(self.user_id)
+        user = await db.find_user(self.user_id, "claim")
         current_lvl = user.get('level', 0)
-        claimed_list = user.get('rewards_claimed', [0]) 
+        claimed_mask = user.get('rewards_mask', 1)
         
         rewards_text = []
         newly_claimed = []
+        items = {}   # {item_id: amount} — все предметы одним $inc
+        roles = []   # все роли одним add_roles
 
-        for lvl in range(1, current_lvl + 1):
-            if lvl not in claimed_list:
-                lvl_data = LEVELS.get(lvl)
-                if not lvl_data: continue
-
-                reward_type = lvl_data.get('type')
-                desc = lvl_data.get('desc', 'Награда')
-
-                if reward_type == 'item':
-                    item_id = lvl_data['id']
-                    amount = lvl_data.get('amount', 1)
-                    await db.add_item(self.user_id, item_id, amount)
-                    rewards_text.append(f"🎒 Предмет: **{desc}** (x{amount})")
-                
-                elif reward_type == 'role':
-                    role_id = lvl_data['id']
-                    role = interaction.guild.get_role(role_id)
-                    if role:
-                        try:
-                            await interaction.user.add_roles(role)
-                            rewards_text.append(f"🎭 Роль: **{role.name}**")
-                        except discord.Forbidden:
-                            rewards_text.append(f"⚠️ Не смог выдать роль (нет прав)")
-                    else:
-                        rewards_text.append(f"⚠️ Роль ID {role_id} удалена")
+        for lvl in unclaimed_levels(claimed_mask, current_lvl):
+            lvl_data = LEVELS.get(lvl)
+            if not lvl_data: continue
 
-                elif reward_type == 'none':
-                    rewards_text.append(f"🎉 Особая награда: **{desc}** (Пиши админу)")
+            reward_type = lvl_data.get('type')
+            desc = lvl_data.get('desc', 'Награда')
 
-                newly_claimed.append(lvl)
+            if reward_type == 'item':
+                item_id = lvl_data['id']
+                amount = lvl_data.get('amount', 1)
+                items[item_id] = items.get(item_id, 0) + amount
+                rewards_text.append(f"🎒 Предмет: **{desc}** (x{amount})")
+            
+            elif reward_type == 'role':
+                role_id = lvl_data['id']
+                role = interaction.guild.get_role(role_id)
+                if role:
+                    roles.append(role)
+                else:
+                    rewards_text.append(f"⚠️ Роль ID {role_id} удалена")
 
-        if newly_claimed:
-            updated_list = claimed_list + newly_claimed
-            await db.update_user(self.user_id, {"rewards_claimed": updated_list})
-            msg = "✅ **Вы получили награды:**\n" + "\n".join(rewards_text)
-            await interaction.followup.send(msg)
-        else:
-            await interaction.followup.send("🤷‍♂️ Наград пока нет!")
+            elif reward_type == 'none':
+                rewards_text.append(f"🎉 Особая награда: **{desc}** (Пиши админу)")
+
+            newly_claimed.append(lvl)
+
+        if not newly_claimed:
+            return await interaction.followup.send("🤷‍♂️ Наград пока нет!")
+
+        # Одно условное обновление: если награды уже забрали (двойной клик) — ничего не выдаем
+        if not await db.claim_rewards(self.user_id, newly_claimed, items):
+            return await interaction.followup.send("⏳ Эти награды уже получены.")
+
+        if roles:
+            try:
+                await interaction.user.add_roles(*roles)
+                rewards_text.extend(f"🎭 Роль: **{role.name}**" for role in roles)
+            except discord.Forbidden:
+                rewards_text.append(f"⚠️ Не смог выдать роли (нет прав): {', '.join(role.name for role in roles)}")
+
+        msg = "✅ **Вы получили награды:**\n" + "\n".join(rewards_text)
+        await interaction.followup.send(msg)
@@ -0,0 +1,110 @@
+from settings import USER_CACHE_TTL, USER_CACHE_SIZE
+from collections import OrderedDict
+import copy
+import time
+
+
+def _walk(doc, path):
+    """Родительский словарь и последний ключ для пути вида 'inventory.item'"""
+    *parents, last = path.split('.')
+    for key in parents:
+        doc = doc.setdefault(key, {})
+        if not isinstance(doc, dict):
+            return None, last
+    return doc, last
+
+
+class UserCache:
+    """
+    Read-through кэш документов пользователей: LRU на size записей, каждая живет ttl секунд.
+    Наружу всегда отдаются глубокие копии — изменение результата не портит кэш.
+    ttl = 0 выключает кэш.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._items = OrderedDict()  # {user_id: (expires_at, doc)}
+        # Растет при каждой записи: чтение, начатое до записи, не кладет в кэш устаревший документ
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.size > 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _entry(self, user_id):
+        entry = self._items.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._items[user_id]
+            return None
+        return entry[1]
+
+    def get(self, user_id):
+        """(True, копия документа) при попадании, (False, None) при промахе"""
+        if not self.enabled:
+            return False, None
+        doc = self._entry(user_id)
+        if doc is None:
+            self.misses += 1
+            return False, None
+        self._items.move_to_end(user_id)
+        self.hits += 1
+        return True, copy.deepcopy(doc)
+
+    def put(self, user_id, doc, epoch=None):
+        """Кладет документ. epoch — значение self.epoch на момент начала чтения из БД."""
+        if not self.enabled or doc is None:
+            return
+        if epoch is not None and epoch != self.epoch:
+            return
+        self._items[user_id] = (time.monotonic() + self.ttl, copy.deepcopy(doc))
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Удаляет запись (или весь кэш, если user_id не указан)"""
+        self.epoch += 1
+        if user_id is None:
+            self._items.clear()
+        else:
+            self._items.pop(user_id, None)
+
+    def patch(self, user_id, set_fields=None, inc_fields=None):
+        """
+        Применяет $set/$inc (поддерживаются пути через точку) к закэшированному документу.
+        Если документа в кэше нет — ничего не делает: следующее чтение возьмет его из БД.
+        """
+        self.epoch += 1
+        doc = self._entry(user_id)
+        if doc is None:
+            return
+        for path, value in (set_fields or {}).items():
+            parent, key = _walk(doc, path)
+            if parent is None:
+                self._items.pop(user_id, None)
+                return
+            parent[key] = copy.deepcopy(value)
+        for path, value in (inc_fields or {}).items():
+            parent, key = _walk(doc, path)
+            if parent is None:
+                self._items.pop(user_id, None)
+                return
+            parent[key] = parent.get(key, 0) + value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "items": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+        }
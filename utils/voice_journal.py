@@ -0,0 +1,198 @@
+from utils.logger import log
+from settings import VOICE_JOURNAL_PATH, VOICE_JOURNAL_COMPACT
+import asyncio
+import os
+import time
+
+# Строки журнала (append-only, по одной на событие):
+#   J <user_id> <channel_id> <ts> — начал копить время в канале (зашел без мута / снял мут / сменил скорость XP)
+#   L <user_id> <ts>  — перестал копить (вышел / замутился), время отдано в буфер XP
+#   T <ts>            — тик: всем открытым сессиям время отдано в буфер, отсчет с ts
+#   F <n>             — буфер XP записан в БД: все, что отдано до строки n, сохранено
+
+
+class VoiceJournal:
+    """
+    Журнал голосовых сессий на диске: переживает падение процесса, а не только штатное выключение.
+    Запись — дописывание строки в буфер файла; на диск (fsync) сбрасывается пачкой через sync().
+    При старте replay() восстанавливает открытые сессии и несохраненные интервалы.
+    path = '' — журнал выключен (все методы ничего не делают).
+    """
+
+    def __init__(self, path=VOICE_JOURNAL_PATH, compact_after=VOICE_JOURNAL_COMPACT):
+        self.path = path
+        self.compact_after = compact_after
+        self._file = None
+        self._lines = 0          # Строк в текущем файле
+        self._last_handoff = -1  # Номер последней строки L/T, отдавшей время в буфер
+        self._committed = 0      # Все, что отдано до этой строки, уже в БД
+        self._dirty = False
+        self._open = {}          # {user_id: (ts, channel_id)} — зеркало открытых сессий для сжатия
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _write(self, line):
+        if not self.enabled:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(line)
+        self._lines += 1
+        self._dirty = True
+
+    def position(self):
+        """Номер следующей строки — метка для committed()"""
+        return self._lines
+
+    def join(self, user_id, channel_id, ts):
+        self._open[user_id] = (ts, channel_id)
+        self._write(self._join_line(user_id, channel_id, ts))
+
+    @staticmethod
+    def _join_line(user_id, channel_id, ts):
+        # Канал неизвестен (0) — при восстановлении считается по базовой скорости
+        return f"J {user_id} {channel_id or 0} {ts:.0f}\n"
+
+    def leave(self, user_id, ts):
+        if self._open.pop(user_id, None) is None:
+            return
+        self._last_handoff = self._lines
+        self._write(f"L {user_id} {ts:.0f}\n")
+
+    def tick(self, ts):
+        if not self._open:
+            return
+        for user_id, (_, channel_id) in self._open.items():
+            self._open[user_id] = (ts, channel_id)
+        self._last_handoff = self._lines
+        self._write(f"T {ts:.0f}\n")
+
+    def committed(self, mark):
+        """Буфер XP, снятый на позиции mark, записан в БД"""
+        if not self.enabled or mark is None:
+            return
+        self._committed = mark
+        self._write(f"F {mark}\n")
+        if self._lines > self.compact_after:
+            self.compact_if_clean()
+
+    def idle(self):
+        """Буфер XP пуст: отданное время не дало XP (короткие сессии) — отмечаем его сохраненным"""
+        if self._last_handoff >= self._committed:
+            self.committed(self._lines)
+
+    def compact_if_clean(self):
+        """Сжимает журнал, если все отданное в буфер время уже записано в БД"""
+        if self._last_handoff < self._committed:
+            self.compact()
+            return True
+        return False
+
+    async def sync(self):
+        """
+        Сбрасывает накопленные строки на диск (fsync в потоке).
+        Если писать нечего — обновляет mtime файла: это время replay() считает последним признаком жизни.
+        """
+        if self._file is None:
+            return
+        if not self._dirty:
+            await asyncio.to_thread(os.utime, self.path)
+            return
+        self._dirty = False
+        self._file.flush()
+        await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    def compact(self):
+        """Переписывает журнал: остаются только открытые сессии (запись через временный файл)"""
+        if not self.enabled:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for user_id, (ts, channel_id) in self._open.items():
+                f.write(self._join_line(user_id, channel_id, ts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self._open)
+        self._last_handoff = -1
+        self._committed = 0
+        self._dirty = False
+
+    def clear(self):
+        """Все сессии сохранены (штатное выключение): закрывает открытые и сжимает журнал"""
+        for user_id in list(self._open):
+            self.leave(user_id, time.time())
+        self.compact_if_clean()
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def _drop_torn_tail(self):
+        """Отрезает недописанную последнюю строку (падение посреди записи), чтобы новые не склеились с ней"""
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def replay(self):
+        """
+        Читает журнал после перезапуска (вызывается до первой записи).
+        Возвращает (intervals, last_seen): intervals — [(user_id, channel_id, start, end)] время, не попавшее в БД
+        (включая сессии, открытые в момент падения, — до last_seen), last_seen — последний признак жизни.
+        Открытые сессии закрываются строкой L на last_seen: после записи буфера XP (committed)
+        все возвращенные интервалы считаются сохраненными.
+        """
+        if not self.enabled or not os.path.exists(self.path):
+            return [], time.time()
+
+        last_seen = os.path.getmtime(self.path)
+        self._drop_torn_tail()
+        opened = {}
+        closed = []  # [(user_id, channel_id, start, end, номер строки)]
+        n = -1
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for n, line in enumerate(f):
+                parts = line.split()
+                try:
+                    if parts[0] == 'J':
+                        # Старый формат без канала: J <user_id> <ts>
+                        channel_id = int(parts[2]) if len(parts) > 3 else 0
+                        opened[int(parts[1])] = (float(parts[-1]), channel_id or None)
+                    elif parts[0] == 'L':
+                        user_id, ts = int(parts[1]), float(parts[2])
+                        if user_id in opened:
+                            start, channel_id = opened.pop(user_id)
+                            closed.append((user_id, channel_id, start, ts, n))
+                    elif parts[0] == 'T':
+                        ts = float(parts[1])
+                        for user_id, (start, channel_id) in opened.items():
+                            closed.append((user_id, channel_id, start, ts, n))
+                            opened[user_id] = (ts, channel_id)
+                    elif parts[0] == 'F':
+                        mark = int(parts[1])
+                        closed = [c for c in closed if c[4] >= mark]
+                except (IndexError, ValueError):
+                    log(f"Журнал войса: битая строка {n + 1}: {line.strip()!r}", level="WARN")
+                    continue
+                if parts[0] in ('J', 'L', 'T'):
+                    last_seen = max(last_seen, float(parts[-1]))
+
+        self._lines = n + 1
+
+        intervals = [c[:4] for c in closed]
+        self._last_handoff = max((c[4] for c in closed), default=-1)
+        for user_id, (start, channel_id) in opened.items():
+            intervals.append((user_id, channel_id, start, last_seen))
+            self._open[user_id] = (start, channel_id)
+            self.leave(user_id, last_seen)
+        return intervals, last_seen
@@ -0,0 +1,131 @@
+class VoiceSession:
+    """Один участник в войсе. start — с какого момента копит время (None — в муте, не копит)."""
+    __slots__ = ("user_id", "guild_id", "channel_id", "joined", "start")
+
+    def __init__(self, user_id, guild_id, channel_id, joined, start):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.joined = joined
+        self.start = start
+
+
+class VoiceSessionStore:
+    """
+    Все, кто сидит в голосовых каналах, с индексами по пользователю, серверу и каналу.
+    Любой переход (вход, выход, переход между каналами, мут) — O(1).
+    Копят время только сессии без мута (start не None), их список отдает farming().
+    """
+
+    def __init__(self):
+        self._by_user = {}        # {user_id: VoiceSession}
+        self._by_channel = {}     # {channel_id: {user_id, ...}}
+        self._by_guild = {}       # {guild_id: {user_id, ...}}
+        self._channel_since = {}  # {channel_id: ts} — с какого момента в канале кто-то есть
+        self._farming = 0
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def __contains__(self, user_id):
+        return user_id in self._by_user
+
+    def get(self, user_id):
+        return self._by_user.get(user_id)
+
+    def _index(self, session, now):
+        self._by_guild.setdefault(session.guild_id, set()).add(session.user_id)
+        members = self._by_channel.setdefault(session.channel_id, set())
+        if not members:
+            self._channel_since[session.channel_id] = now
+        members.add(session.user_id)
+
+    def _unindex(self, session):
+        for index, key in ((self._by_guild, session.guild_id), (self._by_channel, session.channel_id)):
+            members = index.get(key)
+            if members is not None:
+                members.discard(session.user_id)
+                if not members:
+                    del index[key]
+        if session.channel_id not in self._by_channel:
+            self._channel_since.pop(session.channel_id, None)
+
+    def join(self, user_id, guild_id, channel_id, now, farming=True):
+        """Вход в канал (если пользователь уже где-то сидит — переход)"""
+        session = self._by_user.get(user_id)
+        if session is not None:
+            self.move(user_id, channel_id, now)
+            return session
+        session = VoiceSession(user_id, guild_id, channel_id, now, now if farming else None)
+        self._by_user[user_id] = session
+        self._index(session, now)
+        if farming:
+            self._farming += 1
+        return session
+
+    def move(self, user_id, channel_id, now):
+        """Переход в другой канал (накопленное время не прерывается)"""
+        session = self._by_user.get(user_id)
+        if session is None or session.channel_id == channel_id:
+            return session
+        self._unindex(session)
+        session.channel_id = channel_id
+        self._index(session, now)
+        return session
+
+    def leave(self, user_id):
+        """Выход из войса. Возвращает сессию (или None)."""
+        session = self._by_user.pop(user_id, None)
+        if session is not None:
+            self._unindex(session)
+            if session.start is not None:
+                self._farming -= 1
+        return session
+
+    def start_farming(self, user_id, now):
+        """Снял мут — начинает копить время с now"""
+        session = self._by_user.get(user_id)
+        if session is not None and session.start is None:
+            session.start = now
+            self._farming += 1
+        return session
+
+    def stop_farming(self, user_id):
+        """Замутился — возвращает момент, с которого копил время (или None)"""
+        session = self._by_user.get(user_id)
+        if session is None or session.start is None:
+            return None
+        start, session.start = session.start, None
+        self._farming -= 1
+        return start
+
+    def restart(self, user_id, now):
+        """Время до now начислено — отсчет заново"""
+        session = self._by_user.get(user_id)
+        if session is not None and session.start is not None:
+            session.start = now
+
+    def farming(self):
+        """Снимок копящих сессий: [(user_id, channel_id, start)]"""
+        return [(s.user_id, s.channel_id, s.start) for s in self._by_user.values() if s.start is not None]
+
+    def in_channel(self, channel_id):
+        return set(self._by_channel.get(channel_id, ()))
+
+    def in_guild(self, guild_id):
+        return set(self._by_guild.get(guild_id, ()))
+
+    def channel_active_since(self, channel_id):
+        """С какого момента в канале непрерывно кто-то есть (None — пусто)"""
+        return self._channel_since.get(channel_id)
+
+    def clear(self):
+        self.__init__()
+
+    def stats(self):
+        return {
+            "members": len(self._by_user),
+            "farming": self._farming,
+            "channels": len(self._by_channel),
+            "guilds": len(self._by_guild),
+        }
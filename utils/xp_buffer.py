@@ -0,0 +1,75 @@
+from database import db
+from utils.logger import log
+from settings import XP_FLUSH_SIZE
+import asyncio
+
+
+class XPAccumulator:
+    """
+    Накопитель XP с отложенной записью.
+    add() только складывает дельты в память, flush() пишет их одной пачкой (bulk_write с $inc).
+    on_flushed(docs, deltas) вызывается с документами после записи — там проверяются повышения уровня.
+    journal (utils/voice_journal) получает отметку, когда пачка надежно записана.
+    """
+
+    def __init__(self, on_flushed=None, flush_size=XP_FLUSH_SIZE, journal=None):
+        self.on_flushed = on_flushed
+        self.flush_size = flush_size
+        self.journal = journal
+        self._deltas = {}     # {user_id: xp}
+        self._usernames = {}  # {user_id: username} — для создания новых документов
+        self._flush_task = None
+        # Пачки пишутся по очереди — отметки в журнале идут строго по возрастанию
+        self._flush_lock = asyncio.Lock()
+        self.flushed_total = 0
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def add(self, user_id, amount, username=None):
+        if amount <= 0:
+            return
+        self._deltas[user_id] = self._deltas.get(user_id, 0) + amount
+        if username:
+            self._usernames[user_id] = username
+
+        # Набралось много пользователей — сбрасываем, не дожидаясь таймера
+        if len(self._deltas) >= self.flush_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Записывает все накопленные дельты. Возвращает количество записанных пользователей."""
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self):
+        if not self._deltas:
+            if self.journal:
+                self.journal.idle()
+            return 0
+        # Забираем буфер целиком — новые начисления пойдут уже в следующую пачку
+        deltas, usernames = self._deltas, self._usernames
+        self._deltas, self._usernames = {}, {}
+        mark = self.journal.position() if self.journal else None
+
+        try:
+            docs = await db.bulk_add_xp(deltas, usernames)
+        except Exception as e:
+            # Возвращаем дельты обратно, чтобы не потерять опыт
+            for user_id, amount in deltas.items():
+                self._deltas[user_id] = self._deltas.get(user_id, 0) + amount
+            for user_id, name in usernames.items():
+                self._usernames.setdefault(user_id, name)
+            log(f"Ошибка записи XP ({len(deltas)} польз.), повторю позже: {e}", level="ERROR")
+            return 0
+
+        self.flushed_total += len(deltas)
+        if self.journal:
+            self.journal.committed(mark)
+        log(f"💾 XP записан пачкой: {len(deltas)} польз.", level="DEBUG")
+        if self.on_flushed:
+            try:
+                await self.on_flushed(docs, deltas)
+            except Exception as e:
+                log(f"Ошибка обработки повышений уровня: {e}", level="ERROR")
+        return len(deltas)
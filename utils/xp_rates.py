@@ -0,0 +1,88 @@
+from settings import XP_PER_MINUTE, XP_EVENT_CHANNELS, XP_EVENT_MULTIPLIER, XP_BOOST_MULTIPLIER, XP_BOOST_HOURS
+import heapq
+
+
+class XPRates:
+    """
+    Скорость начисления XP за войс: база (XP в минуту) x множитель канала x буст пользователя.
+    Скорости каналов посчитаны заранее (AFK — 0, ивентовые — x2), бусты лежат в словаре,
+    а их окончания — в куче: стоимость расчета не растет с числом активных бустов.
+    xp() интегрирует скорость по интервалу: буст, закончившийся посреди интервала, учитывается только до конца.
+    Закончившийся буст хранится до expire() (до начисления за его хвост), даже если уже выпит новый.
+    """
+
+    def __init__(self, per_minute=XP_PER_MINUTE):
+        self.base_rate = per_minute  # XP в минуту
+        self._channel_rates = {}     # {channel_id: XP в минуту} — только каналы с множителем
+        self._boosts = {}            # {user_id: [(since, until, multiplier), ...]} — последний самый новый
+        self._expiries = []          # куча (until, user_id); устаревшие записи пропускаются при снятии
+        for channel_id in XP_EVENT_CHANNELS:
+            self.set_channel(channel_id, XP_EVENT_MULTIPLIER)
+
+    def set_channel(self, channel_id, multiplier):
+        """Множитель канала (0 — XP не идет, например AFK)"""
+        if channel_id is None:
+            return
+        self._channel_rates[channel_id] = self.base_rate * multiplier
+
+    def rate(self, channel_id):
+        return self._channel_rates.get(channel_id, self.base_rate)
+
+    def add_boost(self, user_id, now, hours=XP_BOOST_HOURS, multiplier=XP_BOOST_MULTIPLIER):
+        """
+        Включает буст на hours часов. Если буст уже идет — продлевает его.
+        Возвращает (since, until, multiplier) — для сохранения в БД.
+        """
+        records = self._boosts.setdefault(user_id, [])
+        if records and records[-1][1] > now:
+            since, until = records[-1][0], records[-1][1] + hours * 3600
+            records.pop()
+        else:
+            # Прошлый буст (если закончился, но еще не начислен) остается до expire()
+            since, until = now, now + hours * 3600
+        self.restore_boost(user_id, since, until, multiplier)
+        return since, until, multiplier
+
+    def restore_boost(self, user_id, since, until, multiplier):
+        """Буст из БД (после перезапуска)"""
+        self._boosts.setdefault(user_id, []).append((since, until, multiplier))
+        heapq.heappush(self._expiries, (until, user_id))
+
+    def boost(self, user_id, now):
+        """Активный буст (since, until, multiplier) или None"""
+        records = self._boosts.get(user_id)
+        return records[-1] if records and records[-1][1] > now else None
+
+    def expire(self, now):
+        """
+        Убирает закончившиеся бусты. Вызывать после начисления за интервал, который их еще покрывал
+        (тик войса), иначе хвост буста не будет учтен.
+        """
+        while self._expiries and self._expiries[0][0] <= now:
+            _, user_id = heapq.heappop(self._expiries)
+            records = self._boosts.get(user_id)
+            if not records:
+                continue
+            # Буст мог быть продлен — тогда его until уже больше now и запись остается
+            records[:] = [r for r in records if r[1] > now]
+            if not records:
+                del self._boosts[user_id]
+
+    def xp(self, user_id, channel_id, start, end):
+        """Сколько XP заработано в канале channel_id за [start, end]"""
+        rate = self.rate(channel_id)
+        if end <= start or not rate:
+            return 0
+        seconds = end - start
+        for since, until, multiplier in self._boosts.get(user_id, ()):
+            overlap = min(end, until) - max(start, since)
+            if overlap > 0:
+                seconds += overlap * (multiplier - 1)
+        return int(seconds / 60 * rate)
+
+    def stats(self):
+        return {"boosts": len(self._boosts), "channels": len(self._channel_rates)}
+
+
+# Глобальный экземпляр
+xp_rates = XPRates()